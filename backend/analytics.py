@@ -0,0 +1,303 @@
+"""Incremental sales rollups for the admin dashboard.
+
+Four rollup tables hold order count, revenue and item quantities per local
+day and per local hour, split by payment type and pre-order flag. They are
+updated in the same transaction as the order write (create, status change,
+delete), so a date-range query only touches the rollup rows for that range no
+matter how many orders exist.
+
+Local time is orders.created_at (UTC) shifted by ANALYTICS_TZ_OFFSET_MINUTES
+(330, IST, by default). The offset the rollups were bucketed with is stored in
+analytics_state; when startup() sees a different one it clears the rollups
+and schedules a backfill, so the tables never mix two offsets.
+
+Orders with status CANCELLED or DECLINED are not counted. Revenue is priced
+from menu.PRICES at the time the order is counted and remembered per order in
+order_revenue, so cancelling or deleting it later subtracts exactly what was
+added even if prices changed in between.
+
+Existing history is loaded by backfill(), in batches of orders by rowid.
+Orders inserted after the backfill started are counted incrementally; the
+backfill only walks rowids up to the high-water mark it recorded, so nothing
+is counted twice and a partially backfilled database stays consistent.
+
+    python backend/analytics.py                  # resume / finish backfill
+    python backend/analytics.py --rebuild        # drop rollups and backfill again
+    python backend/analytics.py --tz-offset 0    # re-bucket in another offset
+"""
+import json
+import argparse
+import datetime
+
+from menu import order_total
+
+EXCLUDED_STATUSES = ('CANCELLED', 'DECLINED')
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS sales_daily (
+        day TEXT, payment TEXT, pre_order INTEGER,
+        orders INTEGER DEFAULT 0, revenue REAL DEFAULT 0,
+        PRIMARY KEY (day, payment, pre_order)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS sales_hourly (
+        day TEXT, hour INTEGER, payment TEXT, pre_order INTEGER,
+        orders INTEGER DEFAULT 0, revenue REAL DEFAULT 0,
+        PRIMARY KEY (day, hour, payment, pre_order)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS item_sales_daily (
+        day TEXT, item_name TEXT, payment TEXT, pre_order INTEGER,
+        qty INTEGER DEFAULT 0,
+        PRIMARY KEY (day, item_name, payment, pre_order)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS item_sales_hourly (
+        day TEXT, hour INTEGER, item_name TEXT, payment TEXT, pre_order INTEGER,
+        qty INTEGER DEFAULT 0,
+        PRIMARY KEY (day, hour, item_name, payment, pre_order)
+    )''',
+    # Revenue each counted order added to the rollups, keyed by orders.rowid
+    '''CREATE TABLE IF NOT EXISTS order_revenue (
+        rowid INTEGER PRIMARY KEY,
+        revenue REAL NOT NULL
+    )''',
+    # Single row: backfill progress. Orders with rowid <= cursor or > until are counted,
+    # bucketed by local time at tz_offset minutes from UTC.
+    '''CREATE TABLE IF NOT EXISTS analytics_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        cursor INTEGER NOT NULL,
+        until INTEGER NOT NULL,
+        tz_offset INTEGER NOT NULL DEFAULT 0
+    )''',
+]
+
+ROLLUP_TABLES = ('sales_daily', 'sales_hourly', 'item_sales_daily', 'item_sales_hourly', 'order_revenue')
+
+ORDER_COLUMNS = 'rowid, created_at, payment, pre_order, items, status'
+
+
+def ensure_tables(conn, tz_offset=None):
+    """Create the rollup tables. A `tz_offset` (minutes) other than the one the
+    rollups were bucketed with clears them and leaves everything to backfill();
+    None keeps the stored offset."""
+    with conn:
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        if 'tz_offset' not in [r[1] for r in conn.execute('PRAGMA table_info(analytics_state)')]:
+            # Rollups from before the setting existed were bucketed in UTC
+            conn.execute('ALTER TABLE analytics_state ADD COLUMN tz_offset INTEGER NOT NULL DEFAULT 0')
+        # First run: everything already in orders is left to backfill()
+        conn.execute('INSERT OR IGNORE INTO analytics_state (id, cursor, until, tz_offset) '
+                     'SELECT 1, 0, COALESCE(MAX(rowid), 0), ? FROM orders', (tz_offset or 0,))
+        stored = conn.execute('SELECT tz_offset FROM analytics_state WHERE id = 1').fetchone()[0]
+        if tz_offset is not None and tz_offset != stored:
+            print(f'[analytics] time zone offset changed from {stored} to {tz_offset} minutes, rollups will be rebuilt')
+            _reset(conn, tz_offset)
+
+
+def _reset(conn, tz_offset):
+    for table in ROLLUP_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+    conn.execute('UPDATE analytics_state SET cursor = 0, until = (SELECT COALESCE(MAX(rowid), 0) FROM orders), '
+                 'tz_offset = ? WHERE id = 1', (tz_offset,))
+
+
+def _counted(status):
+    return (status or 'PENDING') not in EXCLUDED_STATUSES
+
+
+def _items(raw):
+    try:
+        items = json.loads(raw or '{}')
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(items, dict):
+        return {}
+    out = {}
+    for name, qty in items.items():
+        try:
+            out[name] = int(qty)
+        except (TypeError, ValueError):
+            out[name] = 1
+    return out
+
+
+def _local_day_hour(created, tz_offset):
+    try:
+        local = datetime.datetime.fromisoformat(created[:19]) + datetime.timedelta(minutes=tz_offset)
+    except ValueError:
+        return created[:10], 0
+    return local.date().isoformat(), local.hour
+
+
+def _apply(conn, order, sign, tz_offset):
+    """Add (sign=1) or remove (sign=-1) one order row from the rollups."""
+    day, hour = _local_day_hour(order['created_at'] or '', tz_offset)
+    payment = order['payment'] or ''
+    pre = 1 if order['pre_order'] else 0
+    items = _items(order['items'])
+    if sign > 0:
+        revenue = order_total(items, pre)
+        conn.execute('INSERT OR REPLACE INTO order_revenue (rowid, revenue) VALUES (?, ?)', (order['rowid'], revenue))
+    else:
+        row = conn.execute('SELECT revenue FROM order_revenue WHERE rowid = ?', (order['rowid'],)).fetchone()
+        # Counted before order_revenue existed: best effort with today's prices
+        revenue = -(row[0] if row is not None else order_total(items, pre))
+        conn.execute('DELETE FROM order_revenue WHERE rowid = ?', (order['rowid'],))
+    conn.execute('INSERT INTO sales_daily (day, payment, pre_order, orders, revenue) VALUES (?, ?, ?, ?, ?) '
+                 'ON CONFLICT (day, payment, pre_order) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+                 (day, payment, pre, sign, revenue))
+    conn.execute('INSERT INTO sales_hourly (day, hour, payment, pre_order, orders, revenue) VALUES (?, ?, ?, ?, ?, ?) '
+                 'ON CONFLICT (day, hour, payment, pre_order) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+                 (day, hour, payment, pre, sign, revenue))
+    for name, qty in items.items():
+        conn.execute('INSERT INTO item_sales_daily (day, item_name, payment, pre_order, qty) VALUES (?, ?, ?, ?, ?) '
+                     'ON CONFLICT (day, item_name, payment, pre_order) DO UPDATE SET qty = qty + excluded.qty',
+                     (day, name, payment, pre, qty * sign))
+        conn.execute('INSERT INTO item_sales_hourly (day, hour, item_name, payment, pre_order, qty) VALUES (?, ?, ?, ?, ?, ?) '
+                     'ON CONFLICT (day, hour, item_name, payment, pre_order) DO UPDATE SET qty = qty + excluded.qty',
+                     (day, hour, name, payment, pre, qty * sign))
+
+
+def _tracked(conn, rowid):
+    """The rollups' tz offset if this order is counted in them, else None."""
+    state = conn.execute('SELECT cursor, until, tz_offset FROM analytics_state WHERE id = 1').fetchone()
+    if state is None or state[0] < rowid <= state[1]:
+        return None
+    return state[2]
+
+
+def load_order(conn, order_id):
+    """Snapshot an order before changing it; pass the result to the hooks below."""
+    return conn.execute(f'SELECT {ORDER_COLUMNS} FROM orders WHERE id = ?', (order_id,)).fetchone()
+
+
+def order_created(conn, rowid):
+    order = conn.execute(f'SELECT {ORDER_COLUMNS} FROM orders WHERE rowid = ?', (rowid,)).fetchone()
+    if order is not None and _counted(order['status']):
+        tz_offset = _tracked(conn, rowid)
+        if tz_offset is not None:
+            _apply(conn, order, 1, tz_offset)
+
+
+def status_changed(conn, order, new_status):
+    if order is None or _counted(order['status']) == _counted(new_status):
+        return
+    tz_offset = _tracked(conn, order['rowid'])
+    if tz_offset is not None:
+        _apply(conn, order, 1 if _counted(new_status) else -1, tz_offset)
+
+
+def order_deleted(conn, order):
+    if order is not None and _counted(order['status']):
+        tz_offset = _tracked(conn, order['rowid'])
+        if tz_offset is not None:
+            _apply(conn, order, -1, tz_offset)
+
+
+def backfill(conn, batch_size=500, max_batches=None):
+    """Count historical orders in batches, one transaction per batch.
+
+    Resumable: progress is kept in analytics_state. Returns the number of
+    orders scanned.
+    """
+    scanned = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with conn:
+            # Take the write lock before reading so live order writes cannot interleave
+            conn.execute('BEGIN IMMEDIATE')
+            cursor, until, tz_offset = conn.execute('SELECT cursor, until, tz_offset FROM analytics_state WHERE id = 1').fetchone()
+            if cursor >= until:
+                break
+            rows = conn.execute(f'SELECT {ORDER_COLUMNS} FROM orders WHERE rowid > ? AND rowid <= ? '
+                                'ORDER BY rowid LIMIT ?', (cursor, until, batch_size)).fetchall()
+            for order in rows:
+                if _counted(order['status']):
+                    _apply(conn, order, 1, tz_offset)
+            cursor = rows[-1]['rowid'] if rows else until
+            conn.execute('UPDATE analytics_state SET cursor = ? WHERE id = 1', (cursor,))
+        scanned += len(rows)
+        batches += 1
+    return scanned
+
+
+def rebuild(conn, batch_size=500):
+    """Drop all rollup rows and backfill from scratch."""
+    with conn:
+        _reset(conn, conn.execute('SELECT tz_offset FROM analytics_state WHERE id = 1').fetchone()[0])
+    return backfill(conn, batch_size)
+
+
+def backfill_pending(conn):
+    cursor, until = conn.execute('SELECT cursor, until FROM analytics_state WHERE id = 1').fetchone()
+    return cursor < until
+
+
+def query(conn, start, end, granularity='day', top_items=10):
+    """Summarize sales for start..end (inclusive 'YYYY-MM-DD' local dates)."""
+    if granularity == 'hour':
+        series_rows = conn.execute(
+            'SELECT day, hour, SUM(orders) AS orders, SUM(revenue) AS revenue FROM sales_hourly '
+            'WHERE day BETWEEN ? AND ? GROUP BY day, hour ORDER BY day, hour', (start, end)).fetchall()
+        series = [{'day': r['day'], 'hour': r['hour'], 'orders': r['orders'], 'revenue': r['revenue']} for r in series_rows]
+    else:
+        series_rows = conn.execute(
+            'SELECT day, SUM(orders) AS orders, SUM(revenue) AS revenue FROM sales_daily '
+            'WHERE day BETWEEN ? AND ? GROUP BY day ORDER BY day', (start, end)).fetchall()
+        series = [{'day': r['day'], 'orders': r['orders'], 'revenue': r['revenue']} for r in series_rows]
+
+    split_rows = conn.execute(
+        'SELECT payment, pre_order, SUM(orders) AS orders, SUM(revenue) AS revenue FROM sales_daily '
+        'WHERE day BETWEEN ? AND ? GROUP BY payment, pre_order', (start, end)).fetchall()
+    by_payment = {}
+    by_pre_order = {'pre_order': {'orders': 0, 'revenue': 0}, 'regular': {'orders': 0, 'revenue': 0}}
+    total_orders = 0
+    total_revenue = 0
+    for r in split_rows:
+        pay = by_payment.setdefault(r['payment'], {'orders': 0, 'revenue': 0})
+        pay['orders'] += r['orders']
+        pay['revenue'] += r['revenue']
+        bucket = by_pre_order['pre_order' if r['pre_order'] else 'regular']
+        bucket['orders'] += r['orders']
+        bucket['revenue'] += r['revenue']
+        total_orders += r['orders']
+        total_revenue += r['revenue']
+
+    peak_hours = conn.execute(
+        'SELECT hour, SUM(orders) AS orders FROM sales_hourly WHERE day BETWEEN ? AND ? '
+        'GROUP BY hour HAVING SUM(orders) > 0 ORDER BY orders DESC, hour LIMIT 3', (start, end)).fetchall()
+    items = conn.execute(
+        'SELECT item_name, SUM(qty) AS qty FROM item_sales_daily WHERE day BETWEEN ? AND ? '
+        'GROUP BY item_name HAVING SUM(qty) > 0 ORDER BY qty DESC LIMIT ?', (start, end, top_items)).fetchall()
+    return {
+        'from': start,
+        'to': end,
+        'granularity': 'hour' if granularity == 'hour' else 'day',
+        'orders': total_orders,
+        'revenue': total_revenue,
+        'by_payment': by_payment,
+        'by_pre_order': by_pre_order,
+        'peak_hours': [{'hour': r['hour'], 'orders': r['orders']} for r in peak_hours],
+        'top_items': [{'item': r['item_name'], 'qty': r['qty']} for r in items],
+        'series': series,
+        'tz_offset_minutes': conn.execute('SELECT tz_offset FROM analytics_state WHERE id = 1').fetchone()[0],
+        'backfill_pending': backfill_pending(conn),
+    }
+
+
+def main():
+    from app import DB_PATH, connect_db
+    parser = argparse.ArgumentParser(description='Maintain the sales rollup tables.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--rebuild', action='store_true', help='clear the rollups and backfill from scratch')
+    parser.add_argument('--tz-offset', type=int, help='minutes from UTC to bucket by (default: keep the current one)')
+    args = parser.parse_args()
+    conn = connect_db(args.db)
+    ensure_tables(conn, args.tz_offset)
+    scanned = rebuild(conn, args.batch_size) if args.rebuild else backfill(conn, args.batch_size)
+    print(f'[analytics] backfilled {scanned} orders')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
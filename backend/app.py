@@ -1,10 +1,25 @@
 import os
+import queue
 import sqlite3
 import random
 import datetime
-from flask import Flask, request, redirect, render_template, session, flash, url_for, jsonify
+import time
+import requests
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import Flask, Blueprint, Response, current_app, g, request, redirect, render_template, session, flash, url_for, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 
+import analytics
+import combo
+import presence
+import profiling
+import ratelimit
+import repository
+import serializers
+import similar
+from ratelimit import limited
+from writequeue import WriteQueue
+
 # Optional: load environment variables from .env in development
 try:
     from dotenv import load_dotenv
@@ -30,128 +45,275 @@ def normalize_mobile(m):
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'foodreco.db')
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+# Razorpay configuration (test keys provided)
+RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'rzp_test_RzovAOzMUtkoy4')
+RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '8cxFDh7EJeTRNZtrZ4KgPFCL')
+
+# Defaults for create_app(); override with a mapping passed to the factory
+DEFAULT_CONFIG = {
+    'DB_PATH': DB_PATH,
+    'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-secret-key'),
+    'PERMANENT_SESSION_LIFETIME': datetime.timedelta(days=7),  # Session lasts 7 days
+    'RAZORPAY_KEY_ID': RAZORPAY_KEY_ID,
+    'RAZORPAY_KEY_SECRET': RAZORPAY_KEY_SECRET,
+    # Set on the database file by startup(); persists. None leaves it unchanged
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    # Group-commit writer for order/rating/favorite/notification inserts
+    'WRITE_QUEUE_ENABLED': False,
+    'WRITE_QUEUE_MAX_BATCH': 256,
+    'WRITE_QUEUE_MAX_LATENCY': 0.005,  # seconds a batch waits to fill
+    'WRITE_QUEUE_MAXSIZE': 10000,
+    'WRITE_QUEUE_RESULT_TIMEOUT': 10,
+    # Finish any pending sales rollup backfill during startup()
+    'ANALYTICS_BACKFILL_ON_STARTUP': True,
+    'ANALYTICS_TZ_OFFSET_MINUTES': 330,  # local time for daily/hourly rollups (IST); changing it rebuilds them
+    # Active member tracking (see presence.py)
+    'PRESENCE_TTL': 900,  # seconds since last request before a member is inactive
+    'PRESENCE_FLUSH_INTERVAL': 5.0,
+    'PRESENCE_HLL_ENABLED': True,
+    # Budget combo recommender (see combo.py)
+    'COMBO_MAX_BUDGET': 1000,
+    'COMBO_MAX_ITEMS': 4,
+    'COMBO_MAX_QTY': 2,
+    'COMBO_SCORE_TTL': 60.0,
+    # Review-based similar dishes (see similar.py)
+    'SIMILAR_TOP_K': 5,
+    'SIMILAR_SYNC_INTERVAL': 5.0,  # seconds between checks for reviews added by other workers
+    # List endpoint serializer: auto|splice|orjson|json (see serializers.py)
+    'JSON_ENCODER': 'auto',
+}
+
+
+def connect_db(path=None):
+    """Open a new connection. Use this outside of a request (startup, scripts, threads)."""
+    conn = sqlite3.connect(path or DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 
-def ensure_tables():
-    conn = get_db()
-    with conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_mobile TEXT,
-                message TEXT,
-                order_id TEXT,
-                eta_minutes INTEGER,
-                created_at TEXT DEFAULT (datetime('now')),
-                read INTEGER DEFAULT 0
-            )
-        ''')
-
-# Ensure notifications table exists on startup
-ensure_tables()
-
-# Runtime set to track unique logged-in member mobiles (in-memory)
-LOGGED_IN_MEMBERS = set()
-
-# Serve frontend templates and static files from the `frontend` folder
-app = Flask(
-    __name__,
-    static_folder=os.path.join(BASE_DIR, 'frontend'),
-    static_url_path='',  # serve frontend files at web root (e.g. /images/...)
-    template_folder=os.path.join(BASE_DIR, 'frontend', 'templates')
-)
-app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
-app.permanent_session_lifetime = datetime.timedelta(days=7)  # Session lasts 7 days
-
-
-@app.route('/')
+def get_db():
+    """Return the connection for the current request.
+
+    The connection is opened lazily on first use and closed on app context
+    teardown, so it always belongs to the process handling the request and is
+    never inherited across a fork.
+    """
+    conn = g.get('_db')
+    if conn is None:
+        conn = connect_db(current_app.config['DB_PATH'])
+        profile = g.get('_profile')
+        if profile is not None:
+            conn = profile.wrap(conn)
+        g._db = conn
+    return conn
+
+
+def close_db(exc=None):
+    conn = g.pop('_db', None)
+    if conn is not None:
+        conn.close()
+
+
+def run_write(work):
+    """Run `work(conn)` in its own transaction and return its result.
+
+    With WRITE_QUEUE_ENABLED the work is handed to the group-commit writer
+    (see writequeue.py) and this blocks until its batch has committed;
+    otherwise it commits on the request connection. If the writer has not
+    picked the work up within WRITE_QUEUE_RESULT_TIMEOUT it is cancelled and
+    TimeoutError (503) is raised, so a client told to retry never has the
+    write committed as well.
+    """
+    wq = current_app.extensions.get('writequeue')
+    if wq is None:
+        conn = get_db()
+        with conn:
+            # Read-modify-write units (e.g. rollup updates) need the lock up front
+            conn.execute('BEGIN IMMEDIATE')
+            return work(conn)
+    fut = wq.submit(work)
+    try:
+        return fut.result(timeout=current_app.config['WRITE_QUEUE_RESULT_TIMEOUT'])
+    except FutureTimeoutError:
+        if fut.cancel():
+            raise
+        # Already running in the writer: it will commit or fail, report which
+        return fut.result()
+
+
+def json_response(body):
+    """Wrap a body already encoded by the app's serializer."""
+    return current_app.response_class(body, mimetype='application/json')
+
+
+bp = Blueprint('main', __name__)
+
+
+@bp.before_app_request
+def touch_presence():
+    user_id = session.get('user_id')
+    if user_id:
+        current_app.extensions['presence'].touch(user_id)
+
+
+@bp.errorhandler(queue.Full)
+@bp.errorhandler(TimeoutError)
+@bp.errorhandler(FutureTimeoutError)  # not the builtin TimeoutError before Python 3.11
+def write_backlog(e):
+    # The group-commit writer is saturated; ask the client to retry shortly
+    resp = jsonify({'error': 'server busy'})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '1'
+    return resp
+
+
+def create_app(config=None):
+    """Build the Flask app. Does no I/O; call startup() before serving."""
+    # Serve frontend templates and static files from the `frontend` folder
+    app = Flask(
+        __name__,
+        static_folder=os.path.join(BASE_DIR, 'frontend'),
+        static_url_path='',  # serve frontend files at web root (e.g. /images/...)
+        template_folder=os.path.join(BASE_DIR, 'frontend', 'templates')
+    )
+    app.config.update(DEFAULT_CONFIG)
+    if config:
+        app.config.update(config)
+    app.teardown_appcontext(close_db)
+    ratelimit.init_app(app)
+    profiling.init_app(app)
+    if app.config['WRITE_QUEUE_ENABLED']:
+        app.extensions['writequeue'] = WriteQueue(
+            app.config['DB_PATH'],
+            max_batch=app.config['WRITE_QUEUE_MAX_BATCH'],
+            max_latency=app.config['WRITE_QUEUE_MAX_LATENCY'],
+            maxsize=app.config['WRITE_QUEUE_MAXSIZE'],
+        )
+    app.extensions['presence'] = presence.Presence(
+        app.config['DB_PATH'],
+        ttl=app.config['PRESENCE_TTL'],
+        flush_interval=app.config['PRESENCE_FLUSH_INTERVAL'],
+        hll=app.config['PRESENCE_HLL_ENABLED'],
+    )
+    app.extensions['combo'] = combo.ComboRecommender(
+        max_budget=app.config['COMBO_MAX_BUDGET'],
+        max_items=app.config['COMBO_MAX_ITEMS'],
+        max_qty=app.config['COMBO_MAX_QTY'],
+        score_ttl=app.config['COMBO_SCORE_TTL'],
+    )
+    app.extensions['similar'] = similar.SimilarIndex(
+        k=app.config['SIMILAR_TOP_K'],
+        sync_interval=app.config['SIMILAR_SYNC_INTERVAL'],
+    )
+    app.extensions['json_encoder'] = serializers.get_encoder(app.config['JSON_ENCODER'])
+    app.register_blueprint(bp)
+    return app
+
+
+def startup(app):
+    """One-off startup work: schema migrations and cache warm-up.
+
+    Run once per deployment (e.g. in the serve master before workers fork),
+    not at import time. Returns the elapsed time in seconds.
+    """
+    t0 = time.perf_counter()
+    conn = connect_db(app.config['DB_PATH'])
+    try:
+        if app.config['SQLITE_JOURNAL_MODE']:
+            mode = conn.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}").fetchone()[0]
+            print(f'[startup] journal_mode={mode}')
+        repository.ensure_tables(conn)
+        analytics.ensure_tables(conn, app.config['ANALYTICS_TZ_OFFSET_MINUTES'])
+        presence.ensure_tables(conn)
+        if app.config['ANALYTICS_BACKFILL_ON_STARTUP'] and analytics.backfill_pending(conn):
+            print(f'[analytics] backfilled {analytics.backfill(conn)} orders')
+        # Build before workers fork so they share the index copy-on-write
+        print(f"[similar] indexed {app.extensions['similar'].build(conn)} reviews")
+    finally:
+        conn.close()
+    print('[razorpay] using key id:', app.config['RAZORPAY_KEY_ID'])
+    elapsed = time.perf_counter() - t0
+    print(f'[startup] done in {elapsed * 1000:.1f} ms')
+    return elapsed
+
+
+@bp.route('/')
 def index():
     # If already logged in server-side, redirect to appropriate page
     if session.get('user_id'):
         if session.get('is_admin'):
-            return redirect(url_for('admin_html'))
+            return redirect(url_for('.admin_html'))
         else:
-            return redirect(url_for('about_html'))
+            return redirect(url_for('.about_html'))
     return render_template('login.html')
 
 
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 def register():
     name = request.form.get('name')
     mobile = normalize_mobile(request.form.get('mobile'))
     password = request.form.get('password')
     if not (name and mobile and password):
         flash('Missing required fields')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     conn = get_db()
     try:
         with conn:
-            conn.execute(
-                'INSERT INTO users (name, mobile, password_hash, is_admin) VALUES (?, ?, ?, 0)',
-                (name, mobile, generate_password_hash(password))
-            )
+            repository.create_user(conn, name, mobile, generate_password_hash(password))
     except sqlite3.IntegrityError:
         flash('Mobile number already registered')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     flash('Account created. Please login.')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
+@limited('login')
 def login():
     mobile = normalize_mobile(request.form.get('mobile'))
     password = request.form.get('password')
     role = request.form.get('role', 'user')
     print(f"[login] attempt from {request.remote_addr} mobile={mobile} role={role}")
     conn = get_db()
-    user = conn.execute('SELECT * FROM users WHERE mobile = ?', (mobile,)).fetchone()
+    user = repository.get_user_by_mobile(conn, mobile)
     print(f"[login] db_user={'found' if user else 'none'}")
     if not user:
         print("[login] no such user:", mobile)
         flash("Account doesn't exist")
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     # Reject admin accounts when logging in via the user form, and reject non-admins on admin form
     try:
-        is_admin_flag = bool(user['is_admin'])
+        is_admin_flag = bool(user.is_admin)
     except Exception:
         is_admin_flag = False
     if role == 'user' and is_admin_flag:
         print(f"[login] account type mismatch: admin used user form: {mobile}")
         flash("Account doesn't exist")
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     if role == 'admin' and not is_admin_flag:
         print(f"[login] account type mismatch: user used admin form: {mobile}")
         flash("Account doesn't exist")
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
-    if not check_password_hash(user['password_hash'], password):
+    if not check_password_hash(user.password_hash, password):
         print("[login] wrong password for:", mobile)
         flash('Invalid credentials')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
-    session['user_id'] = user['id']
-    session['is_admin'] = bool(user['is_admin'])
+    session['user_id'] = user.id
+    session['is_admin'] = bool(user.is_admin)
     session.permanent = True  # Make session persistent
-    # Track unique logged-in members (in-memory runtime telemetry)
-    try:
-        LOGGED_IN_MEMBERS.add(mobile)
-        print(f"[members] unique logged-in count: {len(LOGGED_IN_MEMBERS)}")
-    except Exception:
-        pass
+    current_app.extensions['presence'].touch(user.id)
     # Redirect to after_login helper which sets localStorage then navigates
     if session['is_admin']:
-        return redirect(url_for('after_login', mobile=mobile, role='admin'))
+        return redirect(url_for('.after_login', mobile=mobile, role='admin'))
     else:
         print("[login] user authenticated:", mobile)
-        return redirect(url_for('after_login', mobile=mobile, role='user'))
+        return redirect(url_for('.after_login', mobile=mobile, role='user'))
 
 
-@app.route('/after_login')
+@bp.route('/after_login')
 def after_login():
     # This returns a small HTML page that sets localStorage then redirects
     mobile = request.args.get('mobile', '')
@@ -160,13 +322,11 @@ def after_login():
     name = ''
     try:
         conn = get_db()
-        row = conn.execute('SELECT name FROM users WHERE mobile = ?', (mobile,)).fetchone()
-        if row:
-            name = row['name']
+        name = repository.get_user_name(conn, mobile) or ''
     except Exception:
         name = ''
     # Use absolute URLs so the browser always navigates to the running server
-    target = url_for('admin_html', _external=True) if role == 'admin' else url_for('about_html', _external=True)
+    target = url_for('.admin_html', _external=True) if role == 'admin' else url_for('.about_html', _external=True)
     print('[after_login] session:', dict(session))
     return f"""<!doctype html>
 <html>
@@ -186,56 +346,56 @@ def after_login():
 """
 
 
-@app.route('/about.html')
+@bp.route('/about.html')
 def about_html():
     server_name = ''
     server_mobile = ''
     try:
         if session.get('user_id'):
             conn = get_db()
-            row = conn.execute('SELECT name, mobile FROM users WHERE id = ?', (session.get('user_id'),)).fetchone()
-            if row:
-                server_name = row['name'] or ''
-                server_mobile = row['mobile'] or ''
+            contact = repository.get_user_contact(conn, session.get('user_id'))
+            if contact:
+                server_name = contact[0] or ''
+                server_mobile = contact[1] or ''
     except Exception:
         pass
     server_role = 'user' if session.get('is_admin') is not True and session.get('user_id') else ''
     return render_template('about.html', server_name=server_name, server_mobile=server_mobile, server_role=server_role)
 
 
-@app.route('/admin.html')
+@bp.route('/admin.html')
 def admin_html():
     # Redirect to login if not authenticated as admin
     print('[admin_html] session at entry:', dict(session))
     if not session.get('user_id') or not session.get('is_admin'):
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     server_name = ''
     server_mobile = ''
     try:
         if session.get('user_id'):
             conn = get_db()
-            row = conn.execute('SELECT name, mobile FROM users WHERE id = ?', (session.get('user_id'),)).fetchone()
-            if row:
-                server_name = row['name'] or ''
-                server_mobile = row['mobile'] or ''
+            contact = repository.get_user_contact(conn, session.get('user_id'))
+            if contact:
+                server_name = contact[0] or ''
+                server_mobile = contact[1] or ''
     except Exception:
         pass
     server_role = 'admin' if session.get('is_admin') else ''
     return render_template('admin.html', server_name=server_name, server_mobile=server_mobile, server_role=server_role)
 
 
-@app.route('/index.html')
+@bp.route('/index.html')
 def index_html():
     server_name = ''
     server_mobile = ''
     try:
         if session.get('user_id'):
             conn = get_db()
-            row = conn.execute('SELECT name, mobile FROM users WHERE id = ?', (session.get('user_id'),)).fetchone()
-            if row:
-                server_name = row['name'] or ''
-                server_mobile = row['mobile'] or ''
+            contact = repository.get_user_contact(conn, session.get('user_id'))
+            if contact:
+                server_name = contact[0] or ''
+                server_mobile = contact[1] or ''
     except Exception:
         pass
     server_role = 'admin' if session.get('is_admin') else ('user' if session.get('user_id') else '')
@@ -243,85 +403,51 @@ def index_html():
     return render_template('index.html', server_name=server_name, server_mobile=server_mobile, server_role=server_role)
 
 
-@app.route('/login.html')
+@bp.route('/login.html')
 def login_html():
     # Prevent showing login UI to already-authenticated users
     if session.get('user_id'):
         if session.get('is_admin'):
-            return redirect(url_for('admin_html'))
+            return redirect(url_for('.admin_html'))
         else:
-            return redirect(url_for('about_html'))
+            return redirect(url_for('.about_html'))
     return render_template('login.html')
 
 
-@app.route('/orders.html')
+@bp.route('/orders.html')
 def orders_html():
     server_name = ''
     server_mobile = ''
     try:
         if session.get('user_id'):
             conn = get_db()
-            row = conn.execute('SELECT name, mobile FROM users WHERE id = ?', (session.get('user_id'),)).fetchone()
-            if row:
-                server_name = row['name'] or ''
-                server_mobile = row['mobile'] or ''
+            contact = repository.get_user_contact(conn, session.get('user_id'))
+            if contact:
+                server_name = contact[0] or ''
+                server_mobile = contact[1] or ''
     except Exception:
         pass
     server_role = 'admin' if session.get('is_admin') else ('user' if session.get('user_id') else '')
     return render_template('orders.html', server_name=server_name, server_mobile=server_mobile, server_role=server_role)
 
 
-@app.route('/ratings.html')
+@bp.route('/ratings.html')
 def ratings_html():
     return render_template('ratings.html')
 
 
-@app.route('/feedback.html')
+@bp.route('/feedback.html')
 def feedback_html():
     return render_template('feedback.html')
 
 
-def _json_load(s):
-    import json
-    try:
-        return json.loads(s)
-    except Exception:
-        return {}
-
-# Razorpay configuration (test keys provided)
-RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'rzp_test_RzovAOzMUtkoy4')
-RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '8cxFDh7EJeTRNZtrZ4KgPFCL')
-
-import requests, time
-
-print('[razorpay] using key id:', RAZORPAY_KEY_ID)
+@bp.route('/api/orders', methods=['GET'])
+def api_get_orders():
+    orders = repository.list_orders(get_db(), request.args.get('mobile'))
+    return json_response(current_app.extensions['json_encoder'].orders(orders))
 
 
-@app.route('/api/orders', methods=['GET'])
-def api_get_orders():
-    conn = get_db()
-    mobile = request.args.get('mobile')
-    if mobile:
-        rows = conn.execute('SELECT * FROM orders WHERE mobile = ? ORDER BY created_at DESC', (mobile,)).fetchall()
-    else:
-        rows = conn.execute('SELECT * FROM orders ORDER BY created_at DESC').fetchall()
-    orders = []
-    for r in rows:
-        orders.append({
-            'id': r['id'],
-            'name': r['name'],
-            'mobile': r['mobile'],
-            'payment': r['payment'],
-            'preOrder': bool(r['pre_order']),
-            'delivery': None if not r['delivery_date'] else {'date': r['delivery_date'], 'time': r['delivery_time']},
-            'items': _json_load(r['items']),
-            'status': r['status'],
-            'created_at': r['created_at']
-        })
-    return jsonify(orders)
-
-
-@app.route('/api/orders', methods=['POST'])
+@bp.route('/api/orders', methods=['POST'])
 def api_create_order():
     import json
     data = request.get_json() or {}
@@ -331,10 +457,9 @@ def api_create_order():
     try:
         if session.get('user_id'):
             conn = get_db()
-            u = conn.execute('SELECT name, mobile FROM users WHERE id = ?', (session.get('user_id'),)).fetchone()
-            if u:
-                data['name'] = u['name']
-                data['mobile'] = u['mobile']
+            contact = repository.get_user_contact(conn, session.get('user_id'))
+            if contact:
+                data['name'], data['mobile'] = contact
     except Exception:
         pass
     # Normalize mobile if provided by client
@@ -343,7 +468,6 @@ def api_create_order():
             data['mobile'] = normalize_mobile(data.get('mobile'))
         except Exception:
             pass
-    conn = get_db()
     # If this is a pre-order, ensure delivery date is at least one day in future
     try:
         if data.get('preOrder') and data.get('delivery') and data.get('delivery').get('date'):
@@ -358,39 +482,47 @@ def api_create_order():
                 return jsonify({'error': 'Pre-orders must be placed at least one day before delivery'}), 400
     except Exception:
         pass
+    row = (
+        data.get('id'),
+        data.get('name'),
+        data.get('mobile'),
+        data.get('payment'),
+        1 if data.get('preOrder') else 0,
+        data.get('delivery', {}).get('date') if data.get('delivery') else None,
+        data.get('delivery', {}).get('time') if data.get('delivery') else None,
+        json.dumps(data.get('items') or {}),
+        data.get('status') or 'PENDING'
+    )
+
+    def insert_order(conn):
+        analytics.order_created(conn, repository.insert_order(conn, row))
+
     try:
-        with conn:
-            conn.execute(
-                'INSERT INTO orders (id, name, mobile, payment, pre_order, delivery_date, delivery_time, items, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                (
-                    data.get('id'),
-                    data.get('name'),
-                    data.get('mobile'),
-                    data.get('payment'),
-                    1 if data.get('preOrder') else 0,
-                    data.get('delivery', {}).get('date') if data.get('delivery') else None,
-                    data.get('delivery', {}).get('time') if data.get('delivery') else None,
-                    json.dumps(data.get('items') or {}),
-                    data.get('status') or 'PENDING'
-                )
-            )
+        run_write(insert_order)
     except sqlite3.IntegrityError:
         return jsonify({'error': 'order exists'}), 409
+    current_app.extensions['combo'].invalidate()
     return jsonify({'ok': True})
 
 
-@app.route('/api/orders/<order_id>/status', methods=['PUT'])
+def _set_order_status(conn, order_id, status):
+    order = analytics.load_order(conn, order_id)
+    repository.update_order_status(conn, order_id, status)
+    analytics.status_changed(conn, order, status)
+
+
+@bp.route('/api/orders/<order_id>/status', methods=['PUT'])
 def api_update_status(order_id):
     data = request.get_json() or {}
     status = data.get('status')
     if not status:
         return jsonify({'error': 'missing status'}), 400
+    run_write(lambda conn: _set_order_status(conn, order_id, status))
+    current_app.extensions['combo'].invalidate()
     conn = get_db()
-    with conn:
-        conn.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
     # Create a notification for the user about status change
     try:
-        row = conn.execute('SELECT mobile, pre_order, delivery_date, delivery_time FROM orders WHERE id = ?', (order_id,)).fetchone()
+        row = repository.get_order_delivery(conn, order_id)
         if row and row['mobile']:
             user_mobile = row['mobile']
             msg = ''
@@ -410,41 +542,33 @@ def api_update_status(order_id):
             else:
                 msg = f'Order {order_id} status updated to {status}.'
             if msg:
-                with conn:
-                    conn.execute('INSERT INTO notifications (user_mobile, message, order_id, eta_minutes) VALUES (?, ?, ?, ?)', (user_mobile, msg, order_id, eta))
+                run_write(lambda conn: repository.insert_notification(conn, user_mobile, msg, order_id, eta))
     except Exception:
         pass
     return jsonify({'ok': True})
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
+    if session.get('user_id'):
+        try:
+            current_app.extensions['presence'].leave(session['user_id'])
+        except sqlite3.Error:
+            pass
     session.clear()
     flash('Logged out')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
 
 ### Ratings API ###
-@app.route('/api/ratings', methods=['GET'])
+@bp.route('/api/ratings', methods=['GET'])
 def api_get_ratings():
-    conn = get_db()
-    rows = conn.execute('SELECT * FROM ratings ORDER BY created_at DESC').fetchall()
-    ratings = []
-    for r in rows:
-        ratings.append({
-            'id': r['id'],
-            'user_name': r['user_name'],
-            'user_mobile': r['user_mobile'],
-            'item_name': r['item_name'],
-            'rating': r['rating'],
-            'review': r['review'],
-            'created_at': r['created_at']
-        })
-    return jsonify(ratings)
-
-
-@app.route('/api/ratings', methods=['POST'])
+    ratings = repository.list_ratings(get_db())
+    return json_response(current_app.extensions['json_encoder'].ratings(ratings))
+
+
+@bp.route('/api/ratings', methods=['POST'])
 def api_create_rating():
     import json
     data = request.get_json() or {}
@@ -460,57 +584,52 @@ def api_create_rating():
     if not (1 <= int(rating) <= 5):
         return jsonify({'error': 'rating must be 1-5'}), 400
     
-    conn = get_db()
     try:
-        with conn:
-            conn.execute(
-                'INSERT INTO ratings (user_mobile, user_name, item_name, rating, review) VALUES (?, ?, ?, ?, ?)',
-                (user_mobile, user_name, item_name, rating, review)
-            )
-    except Exception as e:
+        run_write(lambda conn: repository.insert_rating(conn, user_mobile, user_name, item_name, rating, review))
+    except sqlite3.Error as e:
         return jsonify({'error': str(e)}), 500
+    current_app.extensions['combo'].invalidate()
+    try:
+        current_app.extensions['similar'].sync(get_db(), force=True)
+    except Exception as e:
+        print('[similar] sync failed:', e)
     return jsonify({'ok': True})
 
 
-@app.route('/api/ratings/item/<item_name>', methods=['GET'])
+@bp.route('/api/ratings/item/<item_name>', methods=['GET'])
 def api_get_item_ratings(item_name):
-    conn = get_db()
-    rows = conn.execute('SELECT * FROM ratings WHERE item_name = ? ORDER BY created_at DESC', (item_name,)).fetchall()
-    ratings = [{'rating': r['rating'], 'review': r['review'], 'user_name': r['user_name'], 'created_at': r['created_at']} for r in rows]
+    rows = repository.list_item_ratings(get_db(), item_name)
+    ratings = [r._asdict() for r in rows]
     avg_rating = 0
     if ratings:
         avg_rating = sum(r['rating'] for r in ratings) / len(ratings)
     return jsonify({'item': item_name, 'avg_rating': round(avg_rating, 1), 'count': len(ratings), 'ratings': ratings})
 
 
-@app.route('/api/favorites', methods=['GET'])
+@bp.route('/api/favorites', methods=['GET'])
 def api_get_favorites():
     mobile = request.args.get('mobile')
     if not mobile:
         return jsonify({'error': 'missing mobile'}), 400
-    conn = get_db()
-    rows = conn.execute('SELECT item_name FROM favorites WHERE user_mobile = ? ORDER BY created_at DESC', (mobile,)).fetchall()
-    items = [r['item_name'] for r in rows]
+    items = repository.list_favorites(get_db(), mobile)
     return jsonify({'ok': True, 'favorites': items})
 
 
-@app.route('/api/favorites', methods=['POST'])
+@bp.route('/api/favorites', methods=['POST'])
 def api_add_favorite():
     data = request.get_json() or {}
     mobile = data.get('mobile')
     item = data.get('item')
     if not mobile or not item:
         return jsonify({'error': 'missing fields'}), 400
-    conn = get_db()
     try:
-        with conn:
-            conn.execute('INSERT OR IGNORE INTO favorites (user_mobile, item_name) VALUES (?, ?)', (mobile, item))
-    except Exception as e:
+        run_write(lambda conn: repository.add_favorite(conn, mobile, item))
+    except sqlite3.Error as e:
         return jsonify({'error': str(e)}), 500
     return jsonify({'ok': True})
 
 
-@app.route('/api/favorites', methods=['DELETE'])
+@bp.route('/api/favorites', methods=['DELETE'])
 def api_remove_favorite():
     # Accept JSON body or query parameters to support clients that drop DELETE bodies
     data = request.get_json(silent=True) or {}
@@ -520,27 +639,21 @@ def api_remove_favorite():
         return jsonify({'error': 'missing fields'}), 400
     conn = get_db()
     with conn:
-        conn.execute('DELETE FROM favorites WHERE user_mobile = ? AND item_name = ?', (mobile, item))
+        repository.remove_favorite(conn, mobile, item)
     return jsonify({'ok': True})
 
 
-@app.route('/api/notifications', methods=['GET'])
+@bp.route('/api/notifications', methods=['GET'])
 def api_get_notifications():
     mobile = request.args.get('mobile')
     if not mobile:
         return jsonify({'error': 'missing mobile'}), 400
     mobile = normalize_mobile(mobile)
-    conn = get_db()
-    rows = conn.execute('SELECT * FROM notifications WHERE user_mobile = ? ORDER BY created_at DESC', (mobile,)).fetchall()
-    notes = []
-    for r in rows:
-        notes.append({
-            'id': r['id'], 'message': r['message'], 'order_id': r['order_id'], 'eta_minutes': r['eta_minutes'], 'created_at': r['created_at'], 'read': bool(r['read'])
-        })
-    return jsonify({'ok': True, 'notifications': notes})
+    notes = repository.list_notifications(get_db(), mobile)
+    return json_response(current_app.extensions['json_encoder'].notifications(notes))
 
 
-@app.route('/api/notifications', methods=['POST'])
+@bp.route('/api/notifications', methods=['POST'])
 def api_create_notification():
     data = request.get_json() or {}
     mobile = data.get('mobile')
@@ -550,13 +663,12 @@ def api_create_notification():
     if not mobile or not message:
         return jsonify({'error': 'missing fields'}), 400
     mobile = normalize_mobile(mobile)
-    conn = get_db()
-    with conn:
-        conn.execute('INSERT INTO notifications (user_mobile, message, order_id, eta_minutes) VALUES (?, ?, ?, ?)', (mobile, message, order_id, eta))
+    run_write(lambda conn: repository.insert_notification(conn, mobile, message, order_id, eta))
     return jsonify({'ok': True})
 
 
-@app.route('/api/razorpay_order', methods=['POST'])
+@bp.route('/api/razorpay_order', methods=['POST'])
+@limited('razorpay_order')
 def api_razorpay_order():
     data = request.get_json() or {}
     try:
@@ -572,37 +684,35 @@ def api_razorpay_order():
         'payment_capture': 1
     }
     try:
-        resp = requests.post('https://api.razorpay.com/v1/orders', auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET), json=payload, timeout=10)
+        key_id = current_app.config['RAZORPAY_KEY_ID']
+        key_secret = current_app.config['RAZORPAY_KEY_SECRET']
+        resp = requests.post('https://api.razorpay.com/v1/orders', auth=(key_id, key_secret), json=payload, timeout=10)
         print('[razorpay] status', resp.status_code)
         if resp.status_code not in (200, 201):
             print('[razorpay] error response:', resp.text)
             return jsonify({'error': 'razorpay error', 'detail': resp.text}), 500
         order_data = resp.json()
         print('[razorpay] order created id=', order_data.get('id'))
-        return jsonify({'ok': True, 'order': order_data, 'key_id': RAZORPAY_KEY_ID})
+        return jsonify({'ok': True, 'order': order_data, 'key_id': key_id})
     except Exception as e:
         print('[razorpay] exception', str(e))
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/recommendations', methods=['GET'])
+@bp.route('/api/recommendations', methods=['GET'])
+@limited('recommendations')
 def api_recommendations():
     """Return recommended item names for a user based on past orders (most frequently ordered items).
     Response: { recommendations: [itemName, ...] }
     """
     mobile = request.args.get('mobile')
-    conn = get_db()
-    rows = []
-    if mobile:
-        rows = conn.execute('SELECT items FROM orders WHERE mobile = ?', (mobile,)).fetchall()
-    else:
-        rows = conn.execute('SELECT items FROM orders').fetchall()
+    rows = repository.list_order_items(get_db(), mobile)
     # aggregate counts from JSON stored in items column
     import json
     counts = {}
-    for r in rows:
+    for raw in rows:
         try:
-            items = json.loads(r['items'] or '{}')
+            items = json.loads(raw or '{}')
             if isinstance(items, dict):
                 for name, qty in items.items():
                     try:
@@ -618,21 +728,134 @@ def api_recommendations():
     return jsonify({'ok': True, 'recommendations': recommendations})
 
 
-@app.route('/api/orders/<order_id>/cancel', methods=['POST'])
-def api_cancel_order(order_id):
+@bp.route('/api/recommendations/combo', methods=['GET'])
+def api_recommendations_combo():
+    """Best-scoring set of items within a budget.
+    Query: budget (rupees, required), mood (light|snack|normal|hungry|happy|party), type (veg|non-veg)
+    Response: { budget, items: [{name, price, qty}], total, score }
+    """
+    try:
+        budget = int(float(request.args.get('budget') or 0))
+    except (ValueError, OverflowError):
+        budget = 0
+    if budget <= 0:
+        return jsonify({'error': 'invalid budget'}), 400
+    mood = request.args.get('mood') or None
+    food_type = request.args.get('type') or None
+    try:
+        result = current_app.extensions['combo'].recommend(get_db(), budget, mood, food_type)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'ok': True, **result})
+
+
+@bp.route('/api/recommendations/similar/<item_name>', methods=['GET'])
+def api_recommendations_similar(item_name):
+    """Dishes whose name, category and reviews are most alike.
+    Response: { item, similar: [{item, score}, ...] }
+    """
+    try:
+        k = int(request.args.get('k', current_app.config['SIMILAR_TOP_K']))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= 20:
+        return jsonify({'error': 'k must be between 1 and 20'}), 400
+    index = current_app.extensions['similar']
     conn = get_db()
-    with conn:
-        conn.execute('UPDATE orders SET status = ? WHERE id = ?', ('CANCELLED', order_id))
+    if not index.counts:
+        index.build(conn)
+    else:
+        index.sync(conn)
+    neighbours = index.neighbours(item_name, k)
+    if neighbours is None:
+        return jsonify({'error': 'unknown item'}), 404
+    return jsonify({'ok': True, 'item': item_name, 'similar': [{'item': o, 'score': round(s, 4)} for o, s in neighbours]})
+
+
+@bp.route('/api/orders/<order_id>/cancel', methods=['POST'])
+def api_cancel_order(order_id):
+    run_write(lambda conn: _set_order_status(conn, order_id, 'CANCELLED'))
+    current_app.extensions['combo'].invalidate()
     return jsonify({'ok': True})
 
 
-@app.route('/api/orders/<order_id>', methods=['DELETE'])
+@bp.route('/api/orders/<order_id>', methods=['DELETE'])
 def api_delete_order(order_id):
-    conn = get_db()
-    with conn:
-        conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
+    def delete_order(conn):
+        order = analytics.load_order(conn, order_id)
+        repository.delete_order(conn, order_id)
+        analytics.order_deleted(conn, order)
+
+    run_write(delete_order)
+    current_app.extensions['combo'].invalidate()
     return jsonify({'ok': True})
 
 
+@bp.route('/api/admin/presence', methods=['GET'])
+def api_admin_presence():
+    """Active members (seen within PRESENCE_TTL) and approximate daily/monthly active users."""
+    if not session.get('user_id') or not session.get('is_admin'):
+        return jsonify({'error': 'forbidden'}), 403
+    stats = current_app.extensions['presence'].stats(get_db())
+    return jsonify({'ok': True, **stats})
+
+
+@bp.route('/api/admin/profiles', methods=['GET'])
+def api_admin_profiles():
+    """Recent request profiles (newest first). Requires PROFILING_ENABLED."""
+    if not session.get('user_id') or not session.get('is_admin'):
+        return jsonify({'error': 'forbidden'}), 403
+    if not current_app.config['PROFILING_ENABLED']:
+        return jsonify({'error': 'profiling disabled'}), 404
+    return jsonify({'ok': True, 'profiles': profiling.list_profiles(current_app.config['PROFILING_DB'])})
+
+
+@bp.route('/api/admin/profiles/<int:profile_id>.<fmt>', methods=['GET'])
+def api_admin_profile_download(profile_id, fmt):
+    """Download one profile as .pstats, .collapsed (flamegraph input) or .sql (statement timings)."""
+    if not session.get('user_id') or not session.get('is_admin'):
+        return jsonify({'error': 'forbidden'}), 403
+    if not current_app.config['PROFILING_ENABLED']:
+        return jsonify({'error': 'profiling disabled'}), 404
+    row = profiling.get_profile(current_app.config['PROFILING_DB'], profile_id)
+    if row is None:
+        return jsonify({'error': 'not found'}), 404
+    if fmt == 'pstats' and row['pstats'] is not None:
+        body, mimetype = row['pstats'], 'application/octet-stream'
+    elif fmt == 'collapsed' and row['collapsed'] is not None:
+        body, mimetype = row['collapsed'], 'text/plain'
+    elif fmt == 'sql':
+        body, mimetype = row['sql'], 'application/json'
+    else:
+        return jsonify({'error': f'no {fmt} data for a {row["mode"]} profile'}), 404
+    resp = Response(body, mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.{fmt}'
+    return resp
+
+
+@bp.route('/api/admin/analytics', methods=['GET'])
+def api_admin_analytics():
+    """Sales summary from the rollup tables.
+    Query: from=YYYY-MM-DD&to=YYYY-MM-DD (local dates, see ANALYTICS_TZ_OFFSET_MINUTES; inclusive,
+    default last 7 days), granularity=day|hour
+    """
+    if not session.get('user_id') or not session.get('is_admin'):
+        return jsonify({'error': 'forbidden'}), 403
+    offset = datetime.timedelta(minutes=current_app.config['ANALYTICS_TZ_OFFSET_MINUTES'])
+    today = (datetime.datetime.utcnow() + offset).date()
+    try:
+        end = datetime.date.fromisoformat(request.args.get('to') or today.isoformat())
+        start = datetime.date.fromisoformat(request.args.get('from') or (end - datetime.timedelta(days=6)).isoformat())
+    except ValueError:
+        return jsonify({'error': 'dates must be YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'error': 'from is after to'}), 400
+    granularity = request.args.get('granularity', 'day')
+    summary = analytics.query(get_db(), start.isoformat(), end.isoformat(), granularity)
+    return jsonify({'ok': True, **summary})
+
+
 if __name__ == '__main__':
+    app = create_app()
+    startup(app)
     app.run(debug=True)
@@ -0,0 +1,125 @@
+"""Benchmark the order list read path: legacy handler vs repository + encoders.
+
+Fills a throwaway database with orders and times building the GET /api/orders
+body both ways:
+
+* legacy - what the handler used to do: SELECT *, sqlite3.Row, a dict per
+  row, json.loads of the items column, then the app's JSON provider.
+* one line per encoder in serializers.ENCODERS: repository.list_orders
+  (needed columns, namedtuple rows) and that encoder.
+
+Prints rows/s, the peak memory tracemalloc sees while building one response
+and the number of memory blocks allocated for it: the body plus the rows,
+records and dicts it was built from, counted from a tracemalloc snapshot
+diff with those intermediates still referenced (temporaries an encoder frees
+before returning are not counted). Bodies are checked to decode to the same
+data.
+
+    python backend/bench_serialization.py --orders 5000 --repeat 20
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+from init_db import init_db
+from app import create_app, connect_db
+from menu import MENU
+import repository
+import serializers
+
+
+def fill(db_path, orders):
+    rng = random.Random(42)
+    names = [item['name'] for item in MENU]
+    rows = []
+    for i in range(orders):
+        items = {name: rng.randint(1, 3) for name in rng.sample(names, rng.randint(1, 6))}
+        pre_order = i % 10 == 0
+        rows.append((f'bench-{i}', f'Customer {i % 97}', f'+9199999{i % 500:05d}', rng.choice(['cash', 'upi', 'card']),
+                     1 if pre_order else 0, '2030-01-01' if pre_order else None, '12:30' if pre_order else None,
+                     json.dumps(items), rng.choice(['PENDING', 'ACCEPTED', 'DELIVERED'])))
+    conn = connect_db(db_path)
+    with conn:
+        conn.executemany('INSERT INTO orders (id, name, mobile, payment, pre_order, delivery_date, delivery_time, items, status) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.close()
+
+
+def legacy(app, conn):
+    rows = conn.execute('SELECT * FROM orders ORDER BY created_at DESC').fetchall()
+    orders = []
+    for r in rows:
+        try:
+            items = json.loads(r['items'])
+        except Exception:
+            items = {}
+        orders.append({
+            'id': r['id'],
+            'name': r['name'],
+            'mobile': r['mobile'],
+            'payment': r['payment'],
+            'preOrder': bool(r['pre_order']),
+            'delivery': None if not r['delivery_date'] else {'date': r['delivery_date'], 'time': r['delivery_time']},
+            'items': items,
+            'status': r['status'],
+            'created_at': r['created_at']
+        })
+    return app.json.dumps(orders), (rows, orders)
+
+
+def encoded(encoder, conn):
+    records = repository.list_orders(conn)
+    return encoder.orders(records), records
+
+
+def measure(build, repeat):
+    build()  # warm the statement cache
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        body, _ = build()
+    elapsed = (time.perf_counter() - t0) / repeat
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    result = build()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    return body, elapsed, peak, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        init_db(db_path)
+        fill(db_path, args.orders)
+        app = create_app({'DB_PATH': db_path})
+        conn = connect_db(db_path)
+        cases = [('legacy', lambda: legacy(app, conn))]
+        for name, encoder_class in serializers.ENCODERS.items():
+            encoder = encoder_class()
+            cases.append((name, lambda encoder=encoder: encoded(encoder, conn)))
+        expected = None
+        with app.app_context():
+            for label, build in cases:
+                body, elapsed, peak, blocks = measure(build, args.repeat)
+                data = json.loads(body)
+                expected = expected if expected is not None else data
+                same = 'same' if data == expected else 'DIFFERENT'
+                print(f'{label:>8}: {args.orders / elapsed:10.0f} rows/s  {elapsed * 1000:7.1f} ms/response  '
+                      f'peak {peak / 1024:8.0f} KiB  {blocks:8d} blocks/response  body={same}')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark order ingestion: per-request commits vs the group-commit writer.
+
+Runs concurrent POST /api/orders through the Flask test client against a
+throwaway database and prints orders per second for each mode. Both modes
+run with the journal mode startup() sets (SQLITE_JOURNAL_MODE, WAL by
+default), so only the commit strategy differs.
+
+    python backend/bench_writes.py --threads 16 --orders 200
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+
+from init_db import init_db
+from app import create_app, startup, connect_db
+
+
+def run(write_queue, threads, orders):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        init_db(db_path)
+        app = create_app({'DB_PATH': db_path, 'WRITE_QUEUE_ENABLED': write_queue})
+        startup(app)
+        conn = connect_db(db_path)
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+        errors = []
+
+        def worker(n):
+            client = app.test_client()
+            for i in range(orders):
+                r = client.post('/api/orders', json={
+                    'id': f'bench-{n}-{i}', 'name': 'Bench', 'mobile': '9999900000',
+                    'payment': 'cash', 'items': {'Idly (3)': 2, 'Tea': 1},
+                })
+                if r.status_code != 200:
+                    errors.append(r.status_code)
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        t0 = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        # Duplicate ids must still be rejected with 409 in either mode
+        dup = app.test_client().post('/api/orders', json={'id': 'bench-0-0'}).status_code
+        wq = app.extensions.get('writequeue')
+        if wq is not None:
+            wq.stop()
+        total = threads * orders
+        return total / elapsed, len(errors), dup, journal_mode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=200, help='orders per thread')
+    args = parser.parse_args()
+    for label, enabled in (('per-request commit', False), ('group commit', True)):
+        rate, errors, dup, journal_mode = run(enabled, args.threads, args.orders)
+        print(f'{label:>20}: {rate:8.0f} orders/s  errors={errors}  duplicate->{dup}  journal={journal_mode}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Budget-constrained meal combos.
+
+Picks the highest-value set of at most COMBO_MAX_ITEMS menu items whose total
+price fits a budget (a bounded knapsack with an item-count limit: each item
+at most COMBO_MAX_QTY times, with each extra copy worth half the previous one
+so combos stay varied). An item's value is its score times the square root
+of its price: a full dish counts for more than a side, but not so much that
+the best combo is simply whatever spends the most. The item limit keeps the
+result a meal however large the budget, and the mood boost decides which
+dishes fill it.
+
+Item scores blend order popularity (from the analytics rollups) with a
+smoothed rating average, boosted for items matching the requested mood.
+Scores are recomputed at most every COMBO_SCORE_TTL seconds, or on the next
+call after invalidate() (orders and ratings written by this worker), and
+rounded. The knapsack table is solved once per (mood, type) up to
+COMBO_MAX_BUDGET and kept, so each call only walks it back from the exact
+budget asked for. The tables are dropped only when the rounded scores or menu
+prices actually change.
+"""
+import math
+import time
+import threading
+
+from menu import MENU
+
+# Bayesian smoothing for rating averages: behave like PRIOR_WEIGHT extra ratings of PRIOR_MEAN
+PRIOR_MEAN = 3.5
+PRIOR_WEIGHT = 5
+MOOD_BOOST = 2.0
+
+MOODS = frozenset(item['mood'] for item in MENU)
+TYPES = frozenset(item['type'] for item in MENU)
+
+
+class ComboRecommender:
+    def __init__(self, max_budget=1000, max_items=4, max_qty=2, score_ttl=60.0):
+        self.max_budget = max_budget
+        self.max_items = max_items
+        self.max_qty = max_qty
+        self.score_ttl = score_ttl
+        self._scores = {}
+        self._fingerprint = None
+        self._refreshed = float('-inf')
+        self._solutions = {}
+        self._lock = threading.Lock()
+
+    def recommend(self, conn, budget, mood=None, food_type=None):
+        """Best combo for `budget`. Raises ValueError for a mood or type not on the menu."""
+        if mood and mood not in MOODS:
+            raise ValueError(f'unknown mood: {mood}')
+        if food_type and food_type not in TYPES:
+            raise ValueError(f'unknown type: {food_type}')
+        self._refresh(conn)
+        # Snapshot both so a concurrent refresh can't mix old scores into the new tables
+        scores, solutions = self._scores, self._solutions
+        key = (mood or '', food_type or '')
+        table = solutions.get(key)
+        if table is None:
+            table = solutions[key] = self._solve(scores, *key)
+        candidates, picker = table
+        picked = picker.pick(min(int(budget), self.max_budget))
+        counts = {}
+        for i in picked:
+            name = candidates[i][0]
+            counts[name] = counts.get(name, 0) + 1
+        items = [{'name': item['name'], 'price': item['price'], 'qty': counts[item['name']]}
+                 for item in MENU if item['name'] in counts]
+        return {
+            'budget': budget,
+            'items': items,
+            'total': sum(i['price'] * i['qty'] for i in items),
+            'score': round(sum(candidates[i][2] for i in picked), 3),
+        }
+
+    def invalidate(self):
+        """Recompute scores on the next call. The tables survive if they come out the same."""
+        self._refreshed = float('-inf')
+
+    def _refresh(self, conn):
+        now = time.monotonic()
+        if now - self._refreshed < self.score_ttl:
+            return
+        with self._lock:
+            if now - self._refreshed < self.score_ttl:
+                return
+            scores = compute_scores(conn)
+            fingerprint = hash(tuple((item['name'], item['price'], scores.get(item['name'])) for item in MENU))
+            if fingerprint != self._fingerprint:
+                self._scores = scores
+                self._fingerprint = fingerprint
+                self._solutions = {}
+            self._refreshed = now
+
+    def _solve(self, scores, mood, food_type):
+        candidates = []
+        for item in MENU:
+            if food_type and item['type'] != food_type:
+                continue
+            value = scores.get(item['name'], 1.0) * math.sqrt(item['price'])
+            if mood and item['mood'] == mood:
+                value *= MOOD_BOOST
+            for copy in range(self.max_qty):
+                candidates.append((item['name'], item['price'], value / (2 ** copy)))
+        return candidates, Knapsack(candidates, self.max_budget, self.max_items)
+
+
+def compute_scores(conn):
+    """Score every menu item from popularity and ratings; rounded so small drifts don't bust the memo."""
+    qty = {r[0]: r[1] for r in conn.execute(
+        'SELECT item_name, SUM(qty) FROM item_sales_daily GROUP BY item_name HAVING SUM(qty) > 0')}
+    ratings = {r[0]: (r[1], r[2]) for r in conn.execute(
+        'SELECT item_name, AVG(rating), COUNT(*) FROM ratings GROUP BY item_name')}
+    top = math.log1p(max(qty.values(), default=0)) or 1.0
+    scores = {}
+    for item in MENU:
+        name = item['name']
+        popularity = math.log1p(qty.get(name, 0)) / top
+        avg, count = ratings.get(name, (PRIOR_MEAN, 0))
+        smoothed = (avg * count + PRIOR_MEAN * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT)
+        scores[name] = round(1.0 + popularity + (smoothed - 1) / 4, 2)
+    return scores
+
+
+class Knapsack:
+    """0/1 knapsack over (name, price, value) tuples with at most `max_items` picks,
+    solved once for every budget up to `max_budget`."""
+
+    def __init__(self, candidates, max_budget, max_items):
+        self.candidates = candidates
+        self.width = width = max_budget + 1
+        # best[k][cap]: best value of exactly k items costing at most cap
+        best = [[0.0] * width] + [[-math.inf] * width for _ in range(max_items)]
+        self.keep = []
+        for _, price, value in candidates:
+            row = bytearray(width * (max_items + 1))
+            for k in range(max_items, 0, -1):
+                cur, prev = best[k], best[k - 1]
+                offset = k * width
+                for cap in range(max_budget, price - 1, -1):
+                    alt = prev[cap - price] + value
+                    if alt > cur[cap]:
+                        cur[cap] = alt
+                        row[offset + cap] = 1
+            self.keep.append(row)
+        self.best = best
+
+    def pick(self, budget):
+        """Indexes of the best candidates costing at most `budget`."""
+        k = max(range(len(self.best)), key=lambda k: self.best[k][budget])
+        chosen = []
+        cap = budget
+        for i in range(len(self.candidates) - 1, -1, -1):
+            if k and self.keep[i][k * self.width + cap]:
+                chosen.append(i)
+                cap -= self.candidates[i][1]
+                k -= 1
+        return chosen
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from init_db import init_db
+from app import create_app, startup
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on a fresh database in tmp_path: make_app(**config)."""
+    apps = []
+
+    def factory(**config):
+        db_path = str(tmp_path / 'test.db')
+        if not os.path.exists(db_path):
+            init_db(db_path)
+        config.setdefault('RATE_LIMIT_DB', str(tmp_path / 'ratelimit.db'))
+        app = create_app({'DB_PATH': db_path, **config})
+        startup(app)
+        apps.append(app)
+        return app
+
+    yield factory
+    for app in apps:
+        wq = app.extensions.get('writequeue')
+        if wq is not None:
+            wq.stop()
@@ -5,8 +5,9 @@ from werkzeug.security import generate_password_hash
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'foodreco.db')
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
+def init_db(path=None):
+    path = path or DB_PATH
+    conn = sqlite3.connect(path)
     cur = conn.cursor()
     cur.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -107,7 +108,7 @@ def init_db():
             pass
     conn.commit()
     conn.close()
-    print('Initialized database at', DB_PATH)
+    print('Initialized database at', path)
 
 if __name__ == '__main__':
     init_db()
@@ -0,0 +1,88 @@
+"""Server-side copy of the menu shown in frontend/templates/index.html.
+
+Keep the two in sync: the frontend renders from its own `foods` array, the
+backend uses this one to price orders (analytics) and build recommendations.
+"""
+
+MENU = [
+    # Tiffins
+    {'name': 'Idly (3)', 'price': 25, 'mood': 'light', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Bajji (4)', 'price': 25, 'mood': 'snack', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Poori (2)', 'price': 35, 'mood': 'normal', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Plain Dosa', 'price': 30, 'mood': 'light', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Masala Dosa', 'price': 35, 'mood': 'normal', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Onion Dosa', 'price': 35, 'mood': 'normal', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Egg Dosa', 'price': 40, 'mood': 'normal', 'category': 'Tiffins', 'type': 'non-veg'},
+    {'name': 'Chapathi', 'price': 30, 'mood': 'light', 'category': 'Tiffins', 'type': 'veg'},
+    {'name': 'Parotta', 'price': 30, 'mood': 'light', 'category': 'Tiffins', 'type': 'veg'},
+    # Meals
+    {'name': 'Veg Meals', 'price': 60, 'mood': 'hungry', 'category': 'Meals', 'type': 'veg'},
+    {'name': 'Parcel Veg Meals', 'price': 70, 'mood': 'hungry', 'category': 'Meals', 'type': 'veg'},
+    {'name': 'Chicken Meals', 'price': 80, 'mood': 'hungry', 'category': 'Meals', 'type': 'non-veg'},
+    {'name': 'Parcel Chicken Meals', 'price': 100, 'mood': 'hungry', 'category': 'Meals', 'type': 'non-veg'},
+    # Biryanis
+    {'name': 'Veg Biryani', 'price': 100, 'mood': 'normal', 'category': 'Biryanis', 'type': 'veg'},
+    {'name': 'Paneer Biryani (Half)', 'price': 100, 'mood': 'happy', 'category': 'Biryanis', 'type': 'veg'},
+    {'name': 'Paneer Biryani (Full)', 'price': 130, 'mood': 'happy', 'category': 'Biryanis', 'type': 'veg'},
+    {'name': 'Dum Chicken Biryani (Single)', 'price': 100, 'mood': 'happy', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Dum Chicken Biryani (Full)', 'price': 130, 'mood': 'happy', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Special Chicken Biryani', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Lollipop Biryani', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Fry Piece Biryani', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Chicken Kebab Biryani', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Prawns Biryani', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Wings Biryani', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Mughlai Biryani(Half)', 'price': 130, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    {'name': 'Mughlai Biryani(Full)', 'price': 150, 'mood': 'party', 'category': 'Biryanis', 'type': 'non-veg'},
+    # Fried Rice
+    {'name': 'Veg Fried Rice (Half)', 'price': 60, 'mood': 'light', 'category': 'Fried Rice', 'type': 'veg'},
+    {'name': 'Veg Fried Rice (Full)', 'price': 70, 'mood': 'light', 'category': 'Fried Rice', 'type': 'veg'},
+    {'name': 'Egg Fried Rice (Half)', 'price': 70, 'mood': 'normal', 'category': 'Fried Rice', 'type': 'non-veg'},
+    {'name': 'Egg Fried Rice (Full)', 'price': 80, 'mood': 'normal', 'category': 'Fried Rice', 'type': 'non-veg'},
+    {'name': 'Chicken Fried Rice (Half)', 'price': 80, 'mood': 'hungry', 'category': 'Fried Rice', 'type': 'non-veg'},
+    {'name': 'Chicken Fried Rice (Full)', 'price': 90, 'mood': 'hungry', 'category': 'Fried Rice', 'type': 'non-veg'},
+    # Noodles
+    {'name': 'Veg Noodles (Half)', 'price': 60, 'mood': 'light', 'category': 'Noodles', 'type': 'veg'},
+    {'name': 'Veg Noodles (Full)', 'price': 70, 'mood': 'light', 'category': 'Noodles', 'type': 'veg'},
+    {'name': 'Egg Noodles (Half)', 'price': 70, 'mood': 'normal', 'category': 'Noodles', 'type': 'non-veg'},
+    {'name': 'Egg Noodles (Full)', 'price': 80, 'mood': 'normal', 'category': 'Noodles', 'type': 'non-veg'},
+    {'name': 'Chicken Noodles (Half)', 'price': 80, 'mood': 'hungry', 'category': 'Noodles', 'type': 'non-veg'},
+    {'name': 'Chicken Noodles (Full)', 'price': 90, 'mood': 'hungry', 'category': 'Noodles', 'type': 'non-veg'},
+    # Starters (veg)
+    {'name': 'Veg Manchuria', 'price': 40, 'mood': 'snack', 'category': 'Starters', 'type': 'veg'},
+    {'name': 'Gobi Manchuria', 'price': 40, 'mood': 'snack', 'category': 'Starters', 'type': 'veg'},
+    {'name': 'Chilli Paneer', 'price': 70, 'mood': 'happy', 'category': 'Starters', 'type': 'veg'},
+    # Starters (non-veg)
+    {'name': 'Chilli Chicken', 'price': 80, 'mood': 'happy', 'category': 'Starters', 'type': 'non-veg'},
+    {'name': 'Chicken Manchuria', 'price': 80, 'mood': 'happy', 'category': 'Starters', 'type': 'non-veg'},
+    {'name': 'Chicken 65', 'price': 80, 'mood': 'happy', 'category': 'Starters', 'type': 'non-veg'},
+    {'name': 'Chicken Lollipop', 'price': 120, 'mood': 'party', 'category': 'Starters', 'type': 'non-veg'},
+    {'name': 'Chicken Wings', 'price': 100, 'mood': 'party', 'category': 'Starters', 'type': 'non-veg'},
+    {'name': 'Chicken Majestic', 'price': 120, 'mood': 'party', 'category': 'Starters', 'type': 'non-veg'},
+    {'name': 'Chilli Prawns', 'price': 120, 'mood': 'party', 'category': 'Starters', 'type': 'non-veg'},
+    # Beverages
+    {'name': 'Tea', 'price': 6, 'mood': 'light', 'category': 'Beverages', 'type': 'veg'},
+    {'name': 'Coffee', 'price': 10, 'mood': 'light', 'category': 'Beverages', 'type': 'veg'},
+    # Snacks
+    {'name': 'Punugulu', 'price': 30, 'mood': 'snack', 'category': 'Snacks', 'type': 'veg'},
+    {'name': 'Samosa', 'price': 20, 'mood': 'snack', 'category': 'Snacks', 'type': 'veg'},
+]
+
+PRICES = {item['name']: item['price'] for item in MENU}
+
+# Pre-orders get 10% off, rounded to whole rupees (see checkout in index.html)
+PRE_ORDER_DISCOUNT = 0.9
+
+
+def order_total(items, pre_order=False):
+    """Price an order's {item name: quantity} mapping. Unknown items count as 0."""
+    total = 0
+    for name, qty in (items or {}).items():
+        try:
+            total += PRICES.get(name, 0) * int(qty)
+        except (TypeError, ValueError):
+            continue
+    if pre_order:
+        # Math.round semantics (half up), not Python's banker's rounding
+        total = int(total * PRE_ORDER_DISCOUNT + 0.5)
+    return total
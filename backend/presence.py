@@ -0,0 +1,214 @@
+"""Active member presence shared by all worker processes.
+
+Every authenticated request calls Presence.touch(), which only updates an
+in-memory dict. A background thread per worker process (started lazily on
+the first touch after fork) writes the pending last-seen timestamps to
+SQLite every PRESENCE_FLUSH_INTERVAL seconds in one transaction, so the
+request path never waits on the database. A member counts as active while their
+last-seen time is within PRESENCE_TTL seconds. Logout removes them at once
+and leaves a tombstone, so touches from before the logout that are still
+pending in other workers are not written back by their next flush.
+
+With PRESENCE_HLL_ENABLED, members are also added to a HyperLogLog sketch per
+UTC day (4 KiB each, ~1.6% error). Daily active users come from today's
+sketch, monthly active users from the union of the last 30 daily sketches.
+"""
+import os
+import math
+import time
+import atexit
+import sqlite3
+import hashlib
+import datetime
+import threading
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS presence (user_id INTEGER PRIMARY KEY, last_seen REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS presence_last_seen ON presence (last_seen)',
+    'CREATE TABLE IF NOT EXISTS presence_hll (day TEXT PRIMARY KEY, registers BLOB NOT NULL)',
+    # Logout time per member; older pending touches are dropped on flush
+    'CREATE TABLE IF NOT EXISTS presence_logout (user_id INTEGER PRIMARY KEY, logged_out REAL NOT NULL)',
+]
+
+# Daily sketches kept for monthly counts (plus some slack for late flushes)
+HLL_RETENTION_DAYS = 45
+
+
+def ensure_tables(conn):
+    with conn:
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+
+
+class HyperLogLog:
+    """Fixed-size approximate distinct counter (2**p one-byte registers)."""
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError('register size does not match precision')
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+        idx = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other):
+        regs = self.registers
+        for i, r in enumerate(other.registers):
+            if r > regs[i]:
+                regs[i] = r
+        return self
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class Presence:
+    def __init__(self, path, ttl=900, flush_interval=5.0, hll=True):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.hll = hll
+        self._pending = {}
+        self._sketches = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork: one flusher per process, started lazily
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Forked child: the parent's pending touches are the parent's to flush
+            self._pending = {}
+            self._sketches = {}
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print('[presence] flush thread error:', e)
+
+    def stop(self):
+        """Stop the flusher thread and write what is still pending."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(5)
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            print('[presence] final flush failed:', e)
+
+    def touch(self, user_id, now=None):
+        self._ensure_started()
+        now = now or time.time()
+        day = int(now // 86400)
+        with self._lock:
+            # Only hash a member once per flush interval (and UTC day)
+            prev = self._pending.get(user_id)
+            if self.hll and (prev is None or int(prev // 86400) != day):
+                sketch = self._sketches.get(day)
+                if sketch is None:
+                    sketch = self._sketches[day] = HyperLogLog()
+                sketch.add(user_id)
+            self._pending[user_id] = max(now, prev or 0)
+
+    def leave(self, user_id, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._pending.pop(user_id, None)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                conn.execute('DELETE FROM presence WHERE user_id = ?', (user_id,))
+                conn.execute('INSERT OR REPLACE INTO presence_logout (user_id, logged_out) VALUES (?, ?)', (user_id, now))
+        finally:
+            conn.close()
+
+    def flush(self, now=None):
+        """Write pending timestamps and sketches in one transaction; drop expired rows."""
+        now = now or time.time()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            sketches, self._sketches = self._sketches, {}
+        if not pending and not sketches:
+            return
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany('INSERT INTO presence (user_id, last_seen) SELECT ?1, ?2 WHERE NOT EXISTS '
+                                 '(SELECT 1 FROM presence_logout WHERE user_id = ?1 AND logged_out >= ?2) '
+                                 'ON CONFLICT (user_id) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)',
+                                 pending.items())
+                conn.execute('DELETE FROM presence WHERE last_seen < ?', (now - self.ttl,))
+                # Anything older than a tombstone past the TTL is expired by the line above anyway
+                conn.execute('DELETE FROM presence_logout WHERE logged_out < ?', (now - self.ttl,))
+                for dayno, sketch in sketches.items():
+                    day = _day(dayno * 86400)
+                    row = conn.execute('SELECT registers FROM presence_hll WHERE day = ?', (day,)).fetchone()
+                    if row is not None:
+                        sketch.merge(HyperLogLog(registers=row[0]))
+                    conn.execute('INSERT OR REPLACE INTO presence_hll (day, registers) VALUES (?, ?)',
+                                 (day, bytes(sketch.registers)))
+                if sketches:
+                    cutoff = _day(now - HLL_RETENTION_DAYS * 86400)
+                    conn.execute('DELETE FROM presence_hll WHERE day < ?', (cutoff,))
+        except sqlite3.Error as e:
+            # Presence is best effort: keep the data for the next flush
+            print('[presence] flush failed:', e)
+            with self._lock:
+                for uid, ts in pending.items():
+                    self._pending[uid] = max(ts, self._pending.get(uid, 0))
+                for day, sketch in sketches.items():
+                    self._sketches[day] = sketch.merge(self._sketches[day]) if day in self._sketches else sketch
+        finally:
+            conn.close()
+
+    def stats(self, conn, now=None):
+        """Active count plus approximate DAU/MAU, as seen after flushing this worker."""
+        now = now or time.time()
+        self.flush(now)
+        active = conn.execute('SELECT COUNT(*) FROM presence WHERE last_seen >= ?', (now - self.ttl,)).fetchone()[0]
+        out = {'active': active, 'ttl_seconds': self.ttl}
+        if self.hll:
+            today = _day(now)
+            since = _day(now - 29 * 86400)
+            dau = HyperLogLog()
+            mau = HyperLogLog()
+            for day, registers in conn.execute('SELECT day, registers FROM presence_hll WHERE day >= ?', (since,)):
+                sketch = HyperLogLog(registers=registers)
+                mau.merge(sketch)
+                if day == today:
+                    dau.merge(sketch)
+            out['dau'] = dau.count()
+            out['mau'] = mau.count()
+        return out
+
+
+def _day(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime('%Y-%m-%d')
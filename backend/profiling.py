@@ -0,0 +1,290 @@
+"""On-demand request profiling for production workers.
+
+Off unless PROFILING_ENABLED is set; then a request is profiled when
+
+* it carries an `X-Profile: cprofile` or `X-Profile: sample` header and comes
+  from an admin session (or has `X-Profile-Token` equal to PROFILING_TOKEN), or
+* it is picked by PROFILING_SAMPLE_RATE, optionally limited to the endpoints
+  in PROFILING_ROUTES (e.g. {'api_get_orders', 'api_recommendations'}).
+  Endpoints in PROFILING_SKIP_ENDPOINTS (static files by default) are never
+  sampled.
+
+Profiled requests run under cProfile or a lightweight stack sampler, and every
+SQL statement on the request connection (see get_db) is timed. The last
+PROFILING_KEEP profiles are kept in a small SQLite ring shared by all
+workers, listed by /api/admin/profiles and downloadable as pstats (cProfile)
+or collapsed stacks for flamegraph.pl / speedscope (sampler).
+
+When disabled no hooks are installed at all; when enabled but not triggered a
+request pays one header lookup and one random() call.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import random
+import sqlite3
+import marshal
+import cProfile
+import threading
+from collections import Counter
+
+from flask import current_app, g, request, session
+
+MODES = ('cprofile', 'sample')
+SCHEMA = '''CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL,
+    pid INTEGER,
+    method TEXT,
+    path TEXT,
+    endpoint TEXT,
+    status INTEGER,
+    mode TEXT,
+    duration_ms REAL,
+    sql_count INTEGER,
+    sql_ms REAL,
+    sql TEXT,
+    pstats BLOB,
+    collapsed TEXT
+)'''
+
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+class TimedCursor:
+    def __init__(self, cursor, record):
+        self._cursor = cursor
+        self._record = record
+
+    def _timed(self, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._record['ms'] += (time.perf_counter() - t0) * 1000
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._record['rows'] = len(rows)
+        return rows
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def row_factory(self):
+        return self._cursor.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory):
+        self._cursor.row_factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Wraps a sqlite3 connection and records every statement with its timing."""
+
+    def __init__(self, conn, statements):
+        self._conn = conn
+        self._statements = statements
+
+    def execute(self, sql, params=()):
+        record = {'sql': ' '.join(sql.split()), 'params': len(params), 'ms': 0.0, 'rows': None}
+        self._statements.append(record)
+        t0 = time.perf_counter()
+        cur = self._conn.execute(sql, params)
+        record['ms'] += (time.perf_counter() - t0) * 1000
+        return TimedCursor(cur, record)
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        record = {'sql': ' '.join(sql.split()), 'params': len(seq), 'ms': 0.0, 'rows': None}
+        self._statements.append(record)
+        t0 = time.perf_counter()
+        cur = self._conn.executemany(sql, seq)
+        record['ms'] += (time.perf_counter() - t0) * 1000
+        return cur
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class RequestProfile:
+    def __init__(self, mode, interval):
+        self.mode = mode
+        self.statements = []
+        self.status = None
+        self.started = time.perf_counter()
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Only one cProfile may be active at a time on newer Pythons
+                self.mode = mode = 'sample'
+        if mode == 'sample':
+            self.profiler = StackSampler(threading.get_ident(), interval)
+            self.profiler.start()
+
+    def wrap(self, conn):
+        return TimedConnection(conn, self.statements)
+
+    def finish(self):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        if self.mode == 'sample':
+            self.profiler.stop()
+            pstats_blob, collapsed = None, self.profiler.collapsed()
+        else:
+            self.profiler.disable()
+            self.profiler.create_stats()
+            # Same format pstats.Stats.dump_stats() writes
+            pstats_blob, collapsed = marshal.dumps(self.profiler.stats), None
+        return duration_ms, pstats_blob, collapsed
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=5)
+    conn.row_factory = sqlite3.Row
+    conn.execute(SCHEMA)
+    return conn
+
+
+def _requested_mode(config):
+    mode = request.headers.get('X-Profile')
+    if mode:
+        token = config['PROFILING_TOKEN']
+        allowed = session.get('is_admin') or (
+            token and hmac.compare_digest(request.headers.get('X-Profile-Token', '').encode(), token.encode()))
+        if allowed:
+            return mode if mode in MODES else config['PROFILING_MODE']
+    rate = config['PROFILING_SAMPLE_RATE']
+    if rate and random.random() < rate:
+        endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+        if endpoint in config['PROFILING_SKIP_ENDPOINTS']:
+            return None
+        routes = config['PROFILING_ROUTES']
+        if not routes or endpoint in routes:
+            return config['PROFILING_MODE']
+    return None
+
+
+def _before_request():
+    config = current_app.config
+    mode = _requested_mode(config)
+    if mode:
+        g._profile = RequestProfile(mode, config['PROFILING_SAMPLE_INTERVAL'])
+
+
+def _after_request(response):
+    profile = g.get('_profile')
+    if profile is not None:
+        profile.status = response.status_code
+    return response
+
+
+def _teardown_request(exc=None):
+    profile = g.pop('_profile', None)
+    if profile is None:
+        return
+    duration_ms, pstats_blob, collapsed = profile.finish()
+    sql_ms = sum(s['ms'] for s in profile.statements)
+    keep = current_app.config['PROFILING_KEEP']
+    try:
+        conn = _connect(current_app.config['PROFILING_DB'])
+        try:
+            with conn:
+                conn.execute('INSERT INTO profiles (created_at, pid, method, path, endpoint, status, mode, duration_ms, '
+                             'sql_count, sql_ms, sql, pstats, collapsed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (time.time(), os.getpid(), request.method, request.full_path, request.endpoint,
+                              profile.status or (500 if exc else None), profile.mode, duration_ms,
+                              len(profile.statements), sql_ms, json.dumps(profile.statements), pstats_blob, collapsed))
+                # Ring buffer: keep only the newest PROFILING_KEEP rows
+                conn.execute('DELETE FROM profiles WHERE id <= (SELECT MAX(id) FROM profiles) - ?', (keep,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print('[profiling] could not store profile:', e)
+    print(f'[profiling] {request.method} {request.path} {profile.mode} {duration_ms:.1f} ms, '
+          f'{len(profile.statements)} SQL in {sql_ms:.1f} ms')
+
+
+def list_profiles(path):
+    conn = _connect(path)
+    try:
+        rows = conn.execute('SELECT id, created_at, pid, method, path, endpoint, status, mode, duration_ms, '
+                            'sql_count, sql_ms FROM profiles ORDER BY id DESC').fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+def get_profile(path, profile_id):
+    conn = _connect(path)
+    try:
+        return conn.execute('SELECT * FROM profiles WHERE id = ?', (profile_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def init_app(app):
+    app.config.setdefault('PROFILING_ENABLED', False)
+    app.config.setdefault('PROFILING_MODE', 'cprofile')
+    app.config.setdefault('PROFILING_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILING_SAMPLE_INTERVAL', 0.005)
+    app.config.setdefault('PROFILING_ROUTES', ())
+    app.config.setdefault('PROFILING_SKIP_ENDPOINTS', ('static',))
+    app.config.setdefault('PROFILING_TOKEN', os.environ.get('PROFILING_TOKEN'))
+    app.config.setdefault('PROFILING_KEEP', 50)
+    app.config.setdefault('PROFILING_DB', os.path.join(os.path.dirname(app.config['DB_PATH']), 'profiles.db'))
+    if not app.config['PROFILING_ENABLED']:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
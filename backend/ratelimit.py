@@ -0,0 +1,254 @@
+"""Admission control for expensive endpoints.
+
+Two independent checks run before a limited handler:
+
+* token buckets per client that answer 429 with Retry-After once a client
+  exceeds its rate. Every request is charged to its IP address; the session
+  user and the mobile it sends are extra buckets on top, never a way around
+  the IP bucket. /login is keyed by IP and by IP + mobile only, so guessing
+  across accounts is limited and nobody can lock another user out. A request
+  is only charged when every one of its buckets has a token, so one that is
+  turned away by its user or mobile bucket leaves the IP allowance alone, and
+* a concurrency cap per route that answers 503 with Retry-After instead of
+  queueing requests behind a slow handler (e.g. the Razorpay call).
+
+Buckets live in process memory by default. Set RATE_LIMIT_BACKEND='sqlite'
+to keep them in a small SQLite file so the limits hold across all serve.py
+workers. The concurrency cap is always per worker process.
+
+The client IP is request.remote_addr. Behind a reverse proxy that is the
+proxy's address, so every client would share one bucket: set
+RATE_LIMIT_TRUSTED_PROXIES to the number of proxies in front of the app
+(e.g. 1 for a single nginx) to take the address from X-Forwarded-For via
+werkzeug's ProxyFix. Leave it at 0 when clients connect directly, or anyone
+can pick their own IP by sending the header.
+
+Configure limits per route name in app.config['RATE_LIMITS']:
+    {'login': {'rate': 0.2, 'burst': 5, 'concurrency': 4}, ...}
+rate is tokens per second, burst the bucket size. Omit a key to disable it.
+`keys` picks the buckets charged, from 'ip', 'user', 'mobile', 'ip+mobile'
+(default DEFAULT_KEYS).
+"""
+import os
+import math
+import time
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request, session
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+DEFAULT_LIMITS = {
+    # Full scan of the orders table
+    'recommendations': {'rate': 2.0, 'burst': 10, 'concurrency': 8},
+    # Blocking call to Razorpay (up to 10s)
+    'razorpay_order': {'rate': 0.5, 'burst': 5, 'concurrency': 4},
+    # Password hashing; also slows down credential guessing
+    'login': {'rate': 0.2, 'burst': 5, 'concurrency': 4, 'keys': ('ip', 'ip+mobile')},
+}
+DEFAULT_KEYS = ('ip', 'user', 'mobile')
+
+
+def _wait(levels, rate):
+    """Seconds until every bucket holds a whole token (0.0 if they all do now)."""
+    return max([(1.0 - tokens) / rate for tokens in levels if tokens < 1.0], default=0.0)
+
+
+class MemoryBuckets:
+    """Token buckets in a bounded LRU dict, local to one process."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, keys, rate, burst):
+        """Take one token from every bucket in `keys`, or from none of them if any
+        is empty. Returns (allowed, seconds until all of them have a token)."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key in keys:
+                state = self._buckets.get(key)
+                levels.append(float(burst) if state is None else min(float(burst), state[0] + (now - state[1]) * rate))
+            wait = _wait(levels, rate)
+            if wait:
+                return False, wait
+            for key, tokens in zip(keys, levels):
+                self._buckets[key] = (tokens - 1.0, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                # Evicting the least recently seen client only resets it to a full bucket
+                self._buckets.popitem(last=False)
+        return True, 0.0
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite table shared by every worker process."""
+
+    PURGE_EVERY = 1000
+    IDLE_SECONDS = 3600
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _conn(self):
+        # One connection per thread, reopened after fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, keys, rate, burst):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key in keys:
+                row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+                levels.append(float(burst) if row is None else min(float(burst), row[0] + max(0.0, now - row[1]) * rate))
+            wait = _wait(levels, rate)
+            if not wait:
+                conn.executemany('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                                 [(key, tokens - 1.0, now) for key, tokens in zip(keys, levels)])
+                self._calls += 1
+                if self._calls % self.PURGE_EVERY == 0:
+                    conn.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self.IDLE_SECONDS,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return not wait, wait
+
+
+class RateLimiter:
+    def __init__(self, limits, buckets):
+        self.limits = limits
+        self.buckets = buckets
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+
+    def _semaphore(self, name, size):
+        sem = self._slots.get(name)
+        if sem is None:
+            with self._slots_lock:
+                sem = self._slots.setdefault(name, threading.BoundedSemaphore(size))
+        return sem
+
+    def check_rate(self, name, keys):
+        """Take a token from every bucket in `keys` if all of them have one.
+        Returns seconds to wait, or None if the request is admitted."""
+        conf = self.limits.get(name) or {}
+        rate = conf.get('rate')
+        if not rate or not keys:
+            return None
+        try:
+            allowed, wait = self.buckets.take([f'{name}:{key}' for key in keys], rate, conf.get('burst') or 1)
+        except sqlite3.Error as e:
+            # Fail open: a broken limiter store must not take the site down
+            print('[ratelimit] store error:', e)
+            return None
+        return None if allowed else wait
+
+    def keys_for(self, name):
+        return (self.limits.get(name) or {}).get('keys') or DEFAULT_KEYS
+
+    def concurrency_slot(self, name):
+        """Returns a semaphore already acquired for this request, False if the
+        route is at capacity, or None if the route has no cap."""
+        size = (self.limits.get(name) or {}).get('concurrency')
+        if not size:
+            return None
+        sem = self._semaphore(name, size)
+        return sem if sem.acquire(blocking=False) else False
+
+
+def _request_mobile():
+    mobile = request.args.get('mobile') or request.form.get('mobile')
+    if not mobile and request.is_json:
+        mobile = (request.get_json(silent=True) or {}).get('mobile')
+    return mobile
+
+
+def client_keys(kinds=DEFAULT_KEYS):
+    """Bucket keys for the caller. The IP bucket comes first and is always
+    present when asked for; 'user' and 'mobile' are added only when known."""
+    ip = f'ip:{request.remote_addr}'
+    keys = []
+    for kind in kinds:
+        if kind == 'ip':
+            keys.append(ip)
+        elif kind == 'user':
+            if session.get('user_id'):
+                keys.append(f"user:{session['user_id']}")
+        elif kind == 'mobile':
+            mobile = _request_mobile()
+            if mobile:
+                keys.append(f'mobile:{mobile}')
+        elif kind == 'ip+mobile':
+            keys.append(f'{ip}|mobile:{_request_mobile() or ""}')
+        else:
+            raise ValueError(f'unknown rate limit key: {kind!r}')
+    return keys
+
+
+def _reject(status, error, wait):
+    resp = jsonify({'error': error})
+    resp.status_code = status
+    resp.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return resp
+
+
+def limited(name):
+    """Apply the rate limit and concurrency cap configured for `name`."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions.get('ratelimit')
+            if limiter is None:
+                return view(*args, **kwargs)
+            wait = limiter.check_rate(name, client_keys(limiter.keys_for(name)))
+            if wait is not None:
+                return _reject(429, 'rate limited', wait)
+            slot = limiter.concurrency_slot(name)
+            if slot is False:
+                return _reject(503, 'server busy', current_app.config['RATE_LIMIT_BUSY_RETRY_AFTER'])
+            try:
+                return view(*args, **kwargs)
+            finally:
+                if slot is not None:
+                    slot.release()
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.config.setdefault('RATE_LIMIT_ENABLED', True)
+    app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+    app.config.setdefault('RATE_LIMIT_DB', os.path.join(os.path.dirname(app.config['DB_PATH']), 'ratelimit.db'))
+    app.config.setdefault('RATE_LIMIT_BUSY_RETRY_AFTER', 1)
+    app.config.setdefault('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    hops = app.config['RATE_LIMIT_TRUSTED_PROXIES']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    limits = {name: dict(conf) for name, conf in DEFAULT_LIMITS.items()}
+    for name, conf in (app.config.get('RATE_LIMITS') or {}).items():
+        limits[name] = {**limits.get(name, {}), **conf} if conf else {}
+    app.config['RATE_LIMITS'] = limits
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return
+    if app.config['RATE_LIMIT_BACKEND'] == 'sqlite':
+        buckets = SQLiteBuckets(app.config['RATE_LIMIT_DB'])
+    else:
+        buckets = MemoryBuckets()
+    app.extensions['ratelimit'] = RateLimiter(limits, buckets)
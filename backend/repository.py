@@ -0,0 +1,162 @@
+"""Data access for the request handlers in app.py.
+
+Every statement the handlers run lives here. Functions take the connection
+as their first argument so they work on the request connection (get_db) and
+inside run_write() units alike.
+
+List queries select only the columns the API returns and map rows straight
+into namedtuple records (plain tuples, no per-row dict) via a cursor row
+factory. Order rows carry `items` as the stored JSON text, already checked
+with json_valid(), so serializers.py can splice it into the response instead
+of decoding and re-encoding it.
+"""
+from collections import namedtuple
+
+OrderRecord = namedtuple('OrderRecord', 'id name mobile payment pre_order delivery_date delivery_time items status created_at')
+RatingRecord = namedtuple('RatingRecord', 'id user_name user_mobile item_name rating review created_at')
+ItemRatingRecord = namedtuple('ItemRatingRecord', 'rating review user_name created_at')
+NotificationRecord = namedtuple('NotificationRecord', 'id message order_id eta_minutes created_at read')
+UserRecord = namedtuple('UserRecord', 'id name mobile password_hash is_admin')
+
+# Invalid or NULL items are served as {}, as the handlers always did
+_ITEMS_JSON = "CASE WHEN json_valid(items) THEN items ELSE '{}' END"
+_ORDER_COLUMNS = f'id, name, mobile, payment, pre_order, delivery_date, delivery_time, {_ITEMS_JSON}, status, created_at'
+
+
+def _row_factory(record):
+    make = record._make
+    return lambda _cursor, row: make(row)
+
+
+_ROW_FACTORIES = {record: _row_factory(record) for record in (OrderRecord, RatingRecord, ItemRatingRecord, NotificationRecord, UserRecord)}
+
+
+def _fetch_all(conn, record, sql, params=()):
+    cur = conn.execute(sql, params)
+    cur.row_factory = _ROW_FACTORIES[record]
+    return cur.fetchall()
+
+
+def _fetch_one(conn, record, sql, params=()):
+    cur = conn.execute(sql, params)
+    cur.row_factory = _ROW_FACTORIES[record]
+    return cur.fetchone()
+
+
+def ensure_tables(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_mobile TEXT,
+                message TEXT,
+                order_id TEXT,
+                eta_minutes INTEGER,
+                created_at TEXT DEFAULT (datetime('now')),
+                read INTEGER DEFAULT 0
+            )
+        ''')
+
+
+### Users ###
+
+def create_user(conn, name, mobile, password_hash):
+    conn.execute('INSERT INTO users (name, mobile, password_hash, is_admin) VALUES (?, ?, ?, 0)',
+                 (name, mobile, password_hash))
+
+
+def get_user_by_mobile(conn, mobile):
+    return _fetch_one(conn, UserRecord, 'SELECT id, name, mobile, password_hash, is_admin FROM users WHERE mobile = ?', (mobile,))
+
+
+def get_user_name(conn, mobile):
+    row = conn.execute('SELECT name FROM users WHERE mobile = ?', (mobile,)).fetchone()
+    return row[0] if row else None
+
+
+def get_user_contact(conn, user_id):
+    """(name, mobile) for a user id, or None."""
+    row = conn.execute('SELECT name, mobile FROM users WHERE id = ?', (user_id,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+### Orders ###
+
+def list_orders(conn, mobile=None):
+    if mobile:
+        return _fetch_all(conn, OrderRecord, f'SELECT {_ORDER_COLUMNS} FROM orders WHERE mobile = ? ORDER BY created_at DESC', (mobile,))
+    return _fetch_all(conn, OrderRecord, f'SELECT {_ORDER_COLUMNS} FROM orders ORDER BY created_at DESC')
+
+
+def list_order_items(conn, mobile=None):
+    """Raw items JSON of every order (optionally for one mobile)."""
+    if mobile:
+        cur = conn.execute('SELECT items FROM orders WHERE mobile = ?', (mobile,))
+    else:
+        cur = conn.execute('SELECT items FROM orders')
+    return [r[0] for r in cur.fetchall()]
+
+
+def insert_order(conn, row):
+    """Insert (id, name, mobile, payment, pre_order, delivery_date, delivery_time, items, status); returns the rowid."""
+    cur = conn.execute(
+        'INSERT INTO orders (id, name, mobile, payment, pre_order, delivery_date, delivery_time, items, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        row
+    )
+    return cur.lastrowid
+
+
+def update_order_status(conn, order_id, status):
+    conn.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
+
+
+def get_order_delivery(conn, order_id):
+    return conn.execute('SELECT mobile, pre_order, delivery_date, delivery_time FROM orders WHERE id = ?', (order_id,)).fetchone()
+
+
+def delete_order(conn, order_id):
+    conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
+
+
+### Ratings ###
+
+def list_ratings(conn):
+    return _fetch_all(conn, RatingRecord, 'SELECT id, user_name, user_mobile, item_name, rating, review, created_at '
+                                          'FROM ratings ORDER BY created_at DESC')
+
+
+def list_item_ratings(conn, item_name):
+    return _fetch_all(conn, ItemRatingRecord, 'SELECT rating, review, user_name, created_at FROM ratings '
+                                              'WHERE item_name = ? ORDER BY created_at DESC', (item_name,))
+
+
+def insert_rating(conn, user_mobile, user_name, item_name, rating, review):
+    conn.execute('INSERT INTO ratings (user_mobile, user_name, item_name, rating, review) VALUES (?, ?, ?, ?, ?)',
+                 (user_mobile, user_name, item_name, rating, review))
+
+
+### Favorites ###
+
+def list_favorites(conn, mobile):
+    cur = conn.execute('SELECT item_name FROM favorites WHERE user_mobile = ? ORDER BY created_at DESC', (mobile,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def add_favorite(conn, mobile, item):
+    conn.execute('INSERT OR IGNORE INTO favorites (user_mobile, item_name) VALUES (?, ?)', (mobile, item))
+
+
+def remove_favorite(conn, mobile, item):
+    conn.execute('DELETE FROM favorites WHERE user_mobile = ? AND item_name = ?', (mobile, item))
+
+
+### Notifications ###
+
+def list_notifications(conn, mobile):
+    return _fetch_all(conn, NotificationRecord, 'SELECT id, message, order_id, eta_minutes, created_at, read FROM notifications '
+                                                'WHERE user_mobile = ? ORDER BY created_at DESC', (mobile,))
+
+
+def insert_notification(conn, mobile, message, order_id=None, eta_minutes=None):
+    conn.execute('INSERT INTO notifications (user_mobile, message, order_id, eta_minutes) VALUES (?, ?, ?, ?)',
+                 (mobile, message, order_id, eta_minutes))
@@ -0,0 +1,147 @@
+"""JSON encoders for the list endpoints.
+
+An encoder turns repository records into a response body. Pick one with
+app.config['JSON_ENCODER']:
+
+* 'splice'  - builds the JSON text directly from the record tuples using the
+  stdlib's C string escaper, and copies each order's stored `items` JSON in
+  verbatim (the repository only returns json_valid() text).
+* 'orjson'  - orjson with the stored items passed through as orjson.Fragment
+  (orjson >= 3.9); older orjson versions decode the items with orjson.loads.
+* 'json'    - the stdlib json module on plain dicts, decoding items first.
+  Same output as the original handlers; kept as a reference and fallback.
+* 'auto'    - orjson when it can splice fragments, otherwise 'splice'.
+"""
+import json
+from json.encoder import encode_basestring_ascii
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _scalar(value):
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    return _dumps(value)
+
+
+def _bool(value):
+    return 'true' if value else 'false'
+
+
+def _load_items(raw):
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+
+
+def order_dict(r, items):
+    return {
+        'id': r.id,
+        'name': r.name,
+        'mobile': r.mobile,
+        'payment': r.payment,
+        'preOrder': bool(r.pre_order),
+        'delivery': None if not r.delivery_date else {'date': r.delivery_date, 'time': r.delivery_time},
+        'items': items,
+        'status': r.status,
+        'created_at': r.created_at
+    }
+
+
+def rating_dict(r):
+    return {
+        'id': r.id,
+        'user_name': r.user_name,
+        'user_mobile': r.user_mobile,
+        'item_name': r.item_name,
+        'rating': r.rating,
+        'review': r.review,
+        'created_at': r.created_at
+    }
+
+
+def notification_dict(r):
+    return {
+        'id': r.id, 'message': r.message, 'order_id': r.order_id, 'eta_minutes': r.eta_minutes, 'created_at': r.created_at, 'read': bool(r.read)
+    }
+
+
+class StdlibEncoder:
+    def orders(self, records):
+        return _dumps([order_dict(r, _load_items(r.items)) for r in records])
+
+    def ratings(self, records):
+        return _dumps([rating_dict(r) for r in records])
+
+    def notifications(self, records):
+        return _dumps({'ok': True, 'notifications': [notification_dict(r) for r in records]})
+
+
+class SpliceEncoder(StdlibEncoder):
+    def orders(self, records):
+        s = _scalar
+        parts = []
+        append = parts.append
+        for r in records:
+            if r.delivery_date:
+                delivery = '{"date":%s,"time":%s}' % (s(r.delivery_date), s(r.delivery_time))
+            else:
+                delivery = 'null'
+            append('{"id":%s,"name":%s,"mobile":%s,"payment":%s,"preOrder":%s,"delivery":%s,"items":%s,"status":%s,"created_at":%s}' % (
+                s(r.id), s(r.name), s(r.mobile), s(r.payment), _bool(r.pre_order), delivery,
+                r.items, s(r.status), s(r.created_at)))
+        return '[' + ','.join(parts) + ']'
+
+    def ratings(self, records):
+        s = _scalar
+        return '[' + ','.join([
+            '{"id":%s,"user_name":%s,"user_mobile":%s,"item_name":%s,"rating":%s,"review":%s,"created_at":%s}' % (
+                s(r.id), s(r.user_name), s(r.user_mobile), s(r.item_name), s(r.rating), s(r.review), s(r.created_at))
+            for r in records
+        ]) + ']'
+
+    def notifications(self, records):
+        s = _scalar
+        return '{"ok":true,"notifications":[' + ','.join([
+            '{"id":%s,"message":%s,"order_id":%s,"eta_minutes":%s,"created_at":%s,"read":%s}' % (
+                s(r.id), s(r.message), s(r.order_id), s(r.eta_minutes), s(r.created_at), _bool(r.read))
+            for r in records
+        ]) + ']}'
+
+
+class OrjsonEncoder(StdlibEncoder):
+    def __init__(self):
+        fragment = getattr(orjson, 'Fragment', None)
+        self._items = fragment if fragment is not None else orjson.loads
+
+    def orders(self, records):
+        items = self._items
+        return orjson.dumps([order_dict(r, items(r.items)) for r in records])
+
+    def ratings(self, records):
+        return orjson.dumps([rating_dict(r) for r in records])
+
+    def notifications(self, records):
+        return orjson.dumps({'ok': True, 'notifications': [notification_dict(r) for r in records]})
+
+
+ENCODERS = {'json': StdlibEncoder, 'splice': SpliceEncoder}
+if orjson is not None:
+    ENCODERS['orjson'] = OrjsonEncoder
+
+
+def get_encoder(name='auto'):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None and hasattr(orjson, 'Fragment') else 'splice'
+    try:
+        return ENCODERS[name]()
+    except KeyError:
+        raise ValueError(f'unknown or unavailable JSON encoder: {name!r}') from None
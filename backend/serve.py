@@ -0,0 +1,190 @@
+"""Production entry point: pre-fork multi-worker WSGI server.
+
+The master process builds the app, runs startup() once (migrations, cache
+warm-up) and binds the listening socket. It then forks N workers that share
+the socket and accept connections concurrently. Workers that die are
+restarted, with an exponential backoff while they keep dying right after
+boot; SIGHUP rolls all workers, SIGINT/SIGTERM stops. Workers stop
+gracefully: they close the listening socket, finish in-flight requests and
+exit, and are killed if they take longer than the graceful timeout.
+
+Usage:
+    python backend/serve.py --workers 4 --port 8000
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import threading
+import traceback
+
+from werkzeug.serving import make_server
+
+# Measure from interpreter start as closely as we can
+_T0 = time.perf_counter()
+
+from app import create_app, startup
+
+# A worker that exits sooner than this after being forked counts as a crash
+MIN_UPTIME = 1.0
+MAX_BACKOFF = 30.0
+GRACEFUL_TIMEOUT = 30
+
+
+def _log(msg):
+    print(f'[serve:{os.getpid()}] {msg}', flush=True)
+
+
+def _bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, host, port, threaded):
+    t0 = time.perf_counter()
+    # Default signal handling in the worker: the master owns SIGHUP/SIGINT
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    status = 1
+    try:
+        server = make_server(host, port, app, threaded=threaded, fd=sock.fileno())
+        # Track request threads so server_close() waits for in-flight requests
+        server.daemon_threads = False
+        # shutdown() blocks until serve_forever() returns, so it can't run on this thread
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+        _log(f'worker ready in {(time.perf_counter() - t0) * 1000:.1f} ms')
+        server.serve_forever()
+        server.server_close()
+        status = 0
+    except Exception:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        os._exit(status)
+
+
+class Master:
+    def __init__(self, app, sock, host, port, workers, threaded, graceful_timeout=GRACEFUL_TIMEOUT):
+        self.app = app
+        self.sock = sock
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threaded = threaded
+        self.graceful_timeout = graceful_timeout
+        self.children = {}
+        self.restarting = set()
+        self.backoff = 0.0
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self.app, self.sock, self.host, self.port, self.threaded)
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def kill_all(self, sig=signal.SIGTERM):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+
+    def _on_stop(self, *_):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.kill_all()
+        # Workers still busy after the graceful timeout are killed outright
+        signal.signal(signal.SIGALRM, lambda *_: self.kill_all(signal.SIGKILL))
+        signal.alarm(self.graceful_timeout)
+
+    def _on_hup(self, *_):
+        _log('SIGHUP: restarting workers')
+        self.restarting.update(self.children)
+        self.backoff = 0.0
+        self.kill_all()
+
+    def _respawn_delay(self, pid, started):
+        if pid in self.restarting:
+            self.restarting.discard(pid)
+            return 0.0
+        if time.monotonic() - started >= MIN_UPTIME:
+            self.backoff = 0.0
+            return 0.0
+        self.backoff = min(max(self.backoff * 2, 0.1), MAX_BACKOFF)
+        return self.backoff
+
+    def _sleep(self, seconds):
+        # Short naps so SIGINT/SIGTERM during a backoff are acted on promptly
+        until = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < until:
+            time.sleep(min(0.1, until - time.monotonic()))
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+        t0 = time.perf_counter()
+        for _ in range(self.workers):
+            self.spawn()
+        _log(f'forked {self.workers} workers in {(time.perf_counter() - t0) * 1000:.1f} ms')
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self.children.pop(pid, None)
+            if self.stopping or started is None:
+                continue
+            delay = self._respawn_delay(pid, started)
+            _log(f'worker {pid} exited (status {status}), respawning' + (f' in {delay:.1f} s' if delay else ''))
+            self._sleep(delay)
+            if not self.stopping:
+                self.spawn()
+        signal.alarm(0)
+        _log('all workers stopped')
+
+
+def serve(host='127.0.0.1', port=5000, workers=None, threaded=True, config=None):
+    """Run the app under a pre-fork server. Falls back to a single threaded
+    process on platforms without os.fork (e.g. Windows)."""
+    workers = workers or int(os.environ.get('WEB_CONCURRENCY') or os.cpu_count() or 1)
+    app = create_app(config)
+    startup_s = startup(app)
+    _log(f'boot: import+create_app {(time.perf_counter() - _T0 - startup_s) * 1000:.1f} ms, '
+         f'startup {startup_s * 1000:.1f} ms')
+    if not hasattr(os, 'fork') or workers <= 1:
+        _log(f'single process on http://{host}:{port}')
+        make_server(host, port, app, threaded=threaded).serve_forever()
+        return
+    sock = _bind(host, port)
+    _log(f'listening on http://{host}:{port} with {workers} workers')
+    try:
+        Master(app, sock, host, port, workers, threaded).run()
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the foodreco app with pre-forked workers.')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: $WEB_CONCURRENCY or CPU count)')
+    parser.add_argument('--no-threads', action='store_true', help='handle one request at a time per worker')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, threaded=not args.no_threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Content-based "similar dishes" from review text.
+
+Each item is a bag of words built from its name, its menu category and every
+review written for it. Items are TF-IDF weighted (sublinear tf, smoothed
+idf), L2-normalized and compared by cosine similarity. Menu items with no
+reviews or orders still get neighbours through their name/category tokens.
+Only menu items are indexed; reviews for any other item_name are skipped.
+
+The index is built once in startup() (so pre-forked workers share it) and
+kept current incrementally: sync() pulls only ratings with an id above the
+last one indexed, re-weights the touched items and recomputes their rows of
+the similarity table. Other items keep their idf weights until the next full
+rebuild, which happens every REBUILD_EVERY incremental reviews.
+
+    python backend/similar.py            # print the top neighbours per item
+"""
+import re
+import math
+import time
+import threading
+from collections import Counter
+
+from menu import MENU
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset('''
+    a an and are as at be but by for from had has have i in is it its of on or so that the this
+    to was were with very too my me we our you your they them it's not no just really
+'''.split())
+
+# Name and category tokens count like this many review mentions
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+REBUILD_EVERY = 500
+
+MENU_ITEMS = frozenset(item['name'] for item in MENU)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class SimilarIndex:
+    def __init__(self, k=5, sync_interval=5.0):
+        self.k = k
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.counts = {}        # item -> Counter(term -> raw count)
+        self.df = Counter()     # term -> number of items containing it
+        self.vectors = {}       # item -> {term: weight}, unit length
+        self.sims = {}          # item -> {other: cosine}
+        self._topk = {}         # item -> [(other, score)], cached per row
+        self.last_rating_id = 0
+        self._updates = 0
+        self._last_sync = 0.0
+
+    # -- building ---------------------------------------------------------
+
+    def build(self, conn):
+        """Full rebuild from the menu and every review."""
+        with self._lock:
+            self._reset()
+            for item in MENU:
+                self._seed(item['name'], item['category'])
+            rows = conn.execute('SELECT id, item_name, review FROM ratings ORDER BY id').fetchall()
+            for rating_id, item, review in rows:
+                if item in MENU_ITEMS:
+                    self._count(item, review)
+                self.last_rating_id = rating_id
+            self.vectors = {item: self._vector(item) for item in self.counts}
+            self.sims = {item: {} for item in self.counts}
+            names = list(self.counts)
+            for i, a in enumerate(names):
+                for b in names[i + 1:]:
+                    s = _dot(self.vectors[a], self.vectors[b])
+                    self.sims[a][b] = s
+                    self.sims[b][a] = s
+            self._last_sync = time.monotonic()
+        return len(rows)
+
+    def _seed(self, item, category=None):
+        counts = Counter()
+        for t in tokenize(item):
+            counts[t] += NAME_WEIGHT
+        for t in tokenize(category):
+            counts[t] += CATEGORY_WEIGHT
+        self.counts[item] = counts
+        self.df.update(counts.keys())
+
+    def _count(self, item, review):
+        """Add one review to the raw counts. Returns False if it added nothing."""
+        if item not in self.counts:
+            self._seed(item)
+        tokens = tokenize(review)
+        if not tokens:
+            return False
+        counts = self.counts[item]
+        for t in set(tokens):
+            if t not in counts:
+                self.df[t] += 1
+        counts.update(tokens)
+        return True
+
+    def _vector(self, item):
+        n = len(self.counts)
+        vec = {t: (1 + math.log(c)) * (math.log((1 + n) / (1 + self.df[t])) + 1)
+               for t, c in self.counts[item].items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {t: w / norm for t, w in vec.items()}
+
+    def _update_row(self, item):
+        vec = self.vectors[item] = self._vector(item)
+        row = self.sims.setdefault(item, {})
+        for other, other_vec in self.vectors.items():
+            if other == item:
+                continue
+            s = _dot(vec, other_vec)
+            row[other] = s
+            self.sims.setdefault(other, {})[item] = s
+
+    # -- incremental updates ----------------------------------------------
+
+    def sync(self, conn, force=False):
+        """Index ratings added since the last sync (by any worker)."""
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval:
+            return 0
+        rows = conn.execute('SELECT id, item_name, review FROM ratings WHERE id > ? ORDER BY id',
+                            (self.last_rating_id,)).fetchall()
+        self._last_sync = now
+        if not rows:
+            return 0
+        if self._updates + len(rows) >= REBUILD_EVERY:
+            return self.build(conn)
+        with self._lock:
+            touched = set()
+            for rating_id, item, review in rows:
+                if rating_id <= self.last_rating_id:
+                    continue  # another thread got here first
+                self.last_rating_id = rating_id
+                if item not in MENU_ITEMS:
+                    continue
+                is_new = item not in self.counts
+                if self._count(item, review) or is_new:
+                    touched.add(item)
+            for item in touched:
+                self._update_row(item)
+            self._updates += len(rows)
+            # Cheap to recompute lazily; any row may have gained or lost a neighbour
+            self._topk = {}
+        return len(rows)
+
+    # -- queries ----------------------------------------------------------
+
+    def neighbours(self, item, k=None):
+        """Top-k (other item, cosine) pairs, or None for an unknown item."""
+        k = k or self.k
+        cached = self._topk.get(item)
+        if cached is None or len(cached) < k:
+            # sync() adds keys to these rows in place; sort them under the same lock
+            with self._lock:
+                row = self.sims.get(item)
+                if row is None:
+                    return None
+                cached = sorted(row.items(), key=lambda kv: (-kv[1], kv[0]))[:max(k, self.k)]
+                self._topk[item] = cached
+        return [(other, s) for other, s in cached[:k] if s > 0]
+
+
+def _dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(t, 0.0) for t, w in a.items())
+
+
+def main():
+    from app import DB_PATH, connect_db
+    conn = connect_db(DB_PATH)
+    index = SimilarIndex()
+    print(f'[similar] indexed {index.build(conn)} reviews over {len(index.counts)} items')
+    for item in sorted(index.counts):
+        print(item, '->', ', '.join(f'{o} ({s:.2f})' for o, s in index.neighbours(item)))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import json
+
+import analytics
+import menu
+from app import connect_db
+
+
+MEASURES = {'sales_daily': 'orders != 0 OR revenue', 'sales_hourly': 'orders != 0 OR revenue', 'item_sales_daily': 'qty', 'item_sales_hourly': 'qty'}
+
+
+def _snapshot(conn):
+    # Buckets decremented back to zero are left in place by live updates; a recount never creates them
+    return {table: sorted(tuple(r) for r in conn.execute(
+                f'SELECT * FROM {table}' + (f' WHERE {MEASURES[table]} != 0' if table in MEASURES else '')))
+            for table in analytics.ROLLUP_TABLES}
+
+
+def _insert_history(app, count):
+    conn = connect_db(app.config['DB_PATH'])
+    with conn:
+        for i in range(count):
+            conn.execute('INSERT INTO orders (id, name, mobile, payment, pre_order, items, status, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (f'old-{i}', 'Old', '9876500000', ['cash', 'upi'][i % 2], i % 3 == 0,
+                          json.dumps({'Tea': 1 + i % 2, 'Idly (3)': 1}), ['PENDING', 'CANCELLED'][i % 4 == 1],
+                          f'2026-01-0{1 + i % 5} {10 + i % 8:02d}:15:00'))
+    conn.close()
+
+
+def _order(order_id, **extra):
+    return {'id': order_id, 'name': 'New', 'mobile': '9876500000', 'payment': 'cash',
+            'items': {'Tea': 2, 'Bajji (4)': 1}, **extra}
+
+
+def test_backfill_and_live_writes_match_full_recount(make_app):
+    app = make_app(ANALYTICS_BACKFILL_ON_STARTUP=False)
+    _insert_history(app, 12)
+    # As if the rollups were added to a database that already had these orders
+    conn = connect_db(app.config['DB_PATH'])
+    with conn:
+        conn.execute('UPDATE analytics_state SET cursor = 0, until = (SELECT MAX(rowid) FROM orders)')
+    client = app.test_client()
+
+    # Half way through the backfill, live writes touch both counted and pending rows
+    assert analytics.backfill(conn, batch_size=3, max_batches=2) == 6
+    assert analytics.backfill_pending(conn)
+    for i in range(4):
+        assert client.post('/api/orders', json=_order(f'new-{i}')).status_code == 200
+    for order_id in ('old-0', 'old-9', 'new-0'):
+        assert client.post(f'/api/orders/{order_id}/cancel').status_code == 200
+    for order_id in ('old-2', 'old-10', 'new-1'):
+        assert client.delete(f'/api/orders/{order_id}').status_code == 200
+    assert client.put('/api/orders/old-1/status', json={'status': 'PENDING'}).status_code == 200
+
+    assert analytics.backfill(conn) == 5  # old-10 was deleted before being reached
+    assert not analytics.backfill_pending(conn)
+    incremental = _snapshot(conn)
+    analytics.rebuild(conn, batch_size=4)
+    assert _snapshot(conn) == incremental
+    conn.close()
+
+
+def test_cancel_after_price_change_subtracts_counted_revenue(make_app, monkeypatch):
+    app = make_app()
+    client = app.test_client()
+    assert client.post('/api/orders', json=_order('p-1')).status_code == 200
+    assert client.post('/api/orders', json=_order('p-2')).status_code == 200
+    monkeypatch.setitem(menu.PRICES, 'Tea', menu.PRICES['Tea'] + 50)
+    assert client.post('/api/orders/p-1/cancel').status_code == 200
+    assert client.delete('/api/orders/p-2').status_code == 200
+    conn = connect_db(app.config['DB_PATH'])
+    revenue = [r[0] for r in conn.execute('SELECT revenue FROM sales_daily')]
+    orders = [r[0] for r in conn.execute('SELECT orders FROM sales_daily')]
+    assert revenue == [0] and orders == [0]
+    assert conn.execute('SELECT COUNT(*) FROM order_revenue').fetchone()[0] == 0
+    conn.close()
+
+
+def _hourly(app, day):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['is_admin'] = True
+    return client.get(f'/api/admin/analytics?from={day}&to={day}&granularity=hour').get_json()
+
+
+def test_rollups_use_local_time_and_rebucket_when_the_offset_changes(make_app):
+    app = make_app()
+    conn = connect_db(app.config['DB_PATH'])
+    with conn:
+        conn.execute("INSERT INTO orders (id, mobile, payment, items, created_at) "
+                     "VALUES ('late', '9876500000', 'cash', '{\"Tea\": 1}', '2026-01-01 20:00:00')")
+        analytics.order_created(conn, conn.execute("SELECT rowid FROM orders WHERE id = 'late'").fetchone()[0])
+    # 20:00 UTC is 01:30 the next day in IST
+    summary = _hourly(app, '2026-01-02')
+    assert summary['tz_offset_minutes'] == 330
+    assert [(p['day'], p['hour']) for p in summary['series']] == [('2026-01-02', 1)]
+    assert _hourly(app, '2026-01-01')['orders'] == 0
+
+    utc = make_app(ANALYTICS_TZ_OFFSET_MINUTES=0)
+    assert [(p['day'], p['hour']) for p in _hourly(utc, '2026-01-01')['series']] == [('2026-01-01', 20)]
+    assert _hourly(utc, '2026-01-02')['orders'] == 0
+    incremental = _snapshot(conn)
+    analytics.rebuild(conn)
+    assert _snapshot(conn) == incremental
+    conn.close()
@@ -0,0 +1,63 @@
+import pytest
+
+from menu import MENU
+
+
+@pytest.mark.parametrize('query', ['type=bogus', 'mood=sleepy', 'mood=light&type=vegan'])
+def test_unknown_mood_or_type_is_400(make_app, query):
+    app = make_app()
+    resp = app.test_client().get(f'/api/recommendations/combo?budget=100&{query}')
+    assert resp.status_code == 400
+    assert app.extensions['combo']._solutions == {}
+
+
+def test_small_budget_is_solved_exactly(make_app):
+    resp = make_app().test_client().get('/api/recommendations/combo?budget=9')
+    data = resp.get_json()
+    assert resp.status_code == 200
+    assert data['budget'] == 9
+    assert [i['name'] for i in data['items']] == ['Tea']
+
+
+def test_whole_budget_is_used_not_a_rounded_one(make_app):
+    app = make_app()
+    client = app.test_client()
+    data = client.get('/api/recommendations/combo?budget=59').get_json()
+    assert data['budget'] == 59
+    assert 50 < data['total'] <= 59
+    # Every budget for the same (mood, type) walks back the same solved table
+    assert client.get('/api/recommendations/combo?budget=57').get_json()['total'] <= 57
+    assert list(app.extensions['combo']._solutions) == [('', '')]
+
+
+@pytest.mark.parametrize('budget', [300, 5000])
+def test_combo_is_a_meal_whatever_the_budget(make_app, budget):
+    app = make_app(COMBO_MAX_ITEMS=4)
+    data = app.test_client().get(f'/api/recommendations/combo?budget={budget}&mood=hungry&type=veg').get_json()
+    assert data['total'] <= budget
+    assert 1 <= sum(i['qty'] for i in data['items']) <= 4
+
+
+def test_mood_changes_the_combo(make_app):
+    moods = {item['name']: item['mood'] for item in MENU}
+    client = make_app().test_client()
+    plain = client.get('/api/recommendations/combo?budget=300').get_json()['items']
+    party = client.get('/api/recommendations/combo?budget=300&mood=party').get_json()['items']
+    matching = lambda items: sum(i['qty'] for i in items if moods[i['name']] == 'party')
+    assert matching(party) > matching(plain)
+    assert matching(party) >= 2
+
+
+def test_ratings_and_orders_refresh_scores_before_ttl(make_app):
+    app = make_app(COMBO_SCORE_TTL=3600)
+    client = app.test_client()
+    combo = app.extensions['combo']
+    client.get('/api/recommendations/combo?budget=100')
+    before = dict(combo._scores)
+    assert client.post('/api/ratings', json={'user_mobile': '9876500000', 'item_name': 'Tea', 'rating': 5}).status_code == 200
+    client.get('/api/recommendations/combo?budget=100')
+    assert combo._scores['Tea'] > before['Tea']
+    order = {'id': 'c-1', 'mobile': '9876500000', 'payment': 'cash', 'items': {'Tea': 5}}
+    assert client.post('/api/orders', json=order).status_code == 200
+    client.get('/api/recommendations/combo?budget=100')
+    assert combo._scores['Tea'] > before['Tea'] + 0.5
@@ -2,7 +2,7 @@ import os
 import sqlite3
 import json
 
-from app import app
+from app import create_app, startup
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'foodreco.db')
@@ -19,6 +19,8 @@ def db_rows():
     return rows
 
 def main():
+    app = create_app()
+    startup(app)
     client = app.test_client()
     print('Initial DB rows for', TEST_MOBILE, db_rows())
 
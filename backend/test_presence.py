@@ -0,0 +1,49 @@
+import time
+import sqlite3
+import threading
+
+import presence
+
+T = 1_800_000_000
+
+
+def test_logout_is_not_undone_by_another_workers_flush(tmp_path):
+    path = str(tmp_path / 'presence.db')
+    conn = sqlite3.connect(path)
+    presence.ensure_tables(conn)
+    worker_a = presence.Presence(path, flush_interval=60)
+    worker_b = presence.Presence(path, flush_interval=60)
+    worker_a.touch(1, T)
+    worker_b.touch(1, T + 1)
+    worker_b.touch(2, T + 1)
+    worker_a.leave(1, T + 4)
+    worker_b.flush(T + 5)
+    assert [r[0] for r in conn.execute('SELECT user_id FROM presence')] == [2]
+    # Logging in again after the logout counts as usual
+    worker_b.touch(1, T + 10)
+    worker_b.flush(T + 11)
+    assert worker_a.stats(conn, T + 12)['active'] == 2
+    conn.close()
+
+
+def test_touch_never_flushes_on_the_request_thread(tmp_path, monkeypatch):
+    path = str(tmp_path / 'presence.db')
+    conn = sqlite3.connect(path)
+    presence.ensure_tables(conn)
+    tracker = presence.Presence(path, flush_interval=0.05)
+    flush = tracker.flush
+    flushed_on = []
+
+    def recording_flush(now=None):
+        flushed_on.append(threading.get_ident())
+        return flush(now)
+
+    monkeypatch.setattr(tracker, 'flush', recording_flush)
+    for _ in range(3):
+        for uid in range(50):
+            tracker.touch(uid)
+        time.sleep(0.1)
+    tracker.stop()
+    assert flushed_on and threading.get_ident() not in flushed_on[:-1]
+    assert conn.execute('SELECT COUNT(*) FROM presence').fetchone()[0] == 50
+    conn.close()
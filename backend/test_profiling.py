@@ -0,0 +1,74 @@
+import json
+import pstats
+
+import profiling
+
+
+def _profiled_app(make_app, tmp_path, **config):
+    return make_app(PROFILING_ENABLED=True, PROFILING_DB=str(tmp_path / 'profiles.db'), **config)
+
+
+def _profiles(app):
+    return profiling.list_profiles(app.config['PROFILING_DB'])
+
+
+def _admin(client):
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['is_admin'] = True
+
+
+def test_x_profile_needs_admin_or_token(make_app, tmp_path):
+    app = _profiled_app(make_app, tmp_path, PROFILING_TOKEN='s3cret')
+    client = app.test_client()
+    client.get('/api/orders', headers={'X-Profile': 'cprofile'})
+    client.get('/api/orders', headers={'X-Profile': 'cprofile', 'X-Profile-Token': 'guess'})
+    assert _profiles(app) == []
+    client.get('/api/orders', headers={'X-Profile': 'sample', 'X-Profile-Token': 's3cret'})
+    assert [p['mode'] for p in _profiles(app)] == ['sample']
+
+
+def test_ring_buffer_keeps_the_newest_profiles(make_app, tmp_path):
+    app = _profiled_app(make_app, tmp_path, PROFILING_SAMPLE_RATE=1.0, PROFILING_MODE='sample', PROFILING_KEEP=3)
+    client = app.test_client()
+    for i in range(7):
+        client.get(f'/api/orders?mobile={i}')
+    profiles = _profiles(app)
+    assert len(profiles) == 3
+    assert [p['path'] for p in profiles] == [f'/api/orders?mobile={i}' for i in (6, 5, 4)]
+
+
+def test_static_files_are_not_sampled(make_app, tmp_path):
+    app = _profiled_app(make_app, tmp_path, PROFILING_SAMPLE_RATE=1.0, PROFILING_MODE='sample')
+    resp = app.test_client().get('/styles.css')
+    assert resp.status_code == 200
+    resp.close()
+    assert _profiles(app) == []
+
+
+def test_pstats_download_loads(make_app, tmp_path):
+    app = _profiled_app(make_app, tmp_path)
+    client = app.test_client()
+    _admin(client)
+    client.get('/api/orders', headers={'X-Profile': 'cprofile'})
+    profile_id = _profiles(app)[0]['id']
+    resp = client.get(f'/api/admin/profiles/{profile_id}.pstats')
+    assert resp.status_code == 200
+    path = tmp_path / 'profile.pstats'
+    path.write_bytes(resp.data)
+    stats = pstats.Stats(str(path))
+    assert any(func[2] == 'api_get_orders' for func in stats.stats)
+
+
+def test_sql_inside_run_write_is_recorded(make_app, tmp_path):
+    app = _profiled_app(make_app, tmp_path)
+    client = app.test_client()
+    _admin(client)
+    order = {'id': 'prof-1', 'mobile': '9876500000', 'payment': 'cash', 'items': {'Tea': 1}}
+    assert client.post('/api/orders', json=order, headers={'X-Profile': 'sample'}).status_code == 200
+    profile_id = _profiles(app)[0]['id']
+    statements = json.loads(client.get(f'/api/admin/profiles/{profile_id}.sql').data)
+    sql = [s['sql'] for s in statements]
+    assert 'BEGIN IMMEDIATE' in sql
+    assert any(s.startswith('INSERT INTO orders') for s in sql)
+    assert _profiles(app)[0]['sql_count'] == len(statements)
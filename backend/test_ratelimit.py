@@ -0,0 +1,72 @@
+import pytest
+
+LIMITS = {'recommendations': {'rate': 0.01, 'burst': 3}, 'login': {'rate': 0.01, 'burst': 3}}
+
+
+def _login(client, mobile, ip='10.0.0.1'):
+    return client.post('/login', data={'mobile': mobile, 'password': 'wrong', 'role': 'user'},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_rate_limited_with_retry_after(make_app, backend):
+    client = make_app(RATE_LIMITS=LIMITS, RATE_LIMIT_BACKEND=backend).test_client()
+    codes = [client.get('/api/recommendations').status_code for _ in range(4)]
+    assert codes == [200, 200, 200, 429]
+    resp = client.get('/api/recommendations')
+    assert resp.status_code == 429
+    assert int(resp.headers['Retry-After']) >= 1
+
+
+def test_changing_mobile_does_not_bypass_limit(make_app):
+    client = make_app(RATE_LIMITS=LIMITS).test_client()
+    codes = [client.get(f'/api/recommendations?mobile={i}').status_code for i in range(6)]
+    assert codes.count(429) == 3
+
+
+def test_login_limited_across_mobiles(make_app):
+    client = make_app(RATE_LIMITS=LIMITS).test_client()
+    codes = [_login(client, f'98765000{i:02d}').status_code for i in range(6)]
+    assert codes[:3] == [302, 302, 302]
+    assert codes[3:] == [429, 429, 429]
+
+
+def test_login_failures_do_not_lock_out_other_clients(make_app):
+    client = make_app(RATE_LIMITS=LIMITS).test_client()
+    victim = '9876500000'
+    for _ in range(5):
+        _login(client, victim, ip='10.0.0.66')
+    assert _login(client, victim, ip='10.0.0.1').status_code == 302
+
+
+def test_concurrency_cap_answers_503(make_app):
+    app = make_app(RATE_LIMITS={'recommendations': {'concurrency': 2}})
+    limiter = app.extensions['ratelimit']
+    slots = [limiter.concurrency_slot('recommendations') for _ in range(2)]
+    resp = app.test_client().get('/api/recommendations')
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '1'
+    for slot in slots:
+        slot.release()
+    assert app.test_client().get('/api/recommendations').status_code == 200
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_rejected_request_does_not_use_up_ip_allowance(make_app, backend):
+    client = make_app(RATE_LIMITS=LIMITS, RATE_LIMIT_BACKEND=backend).test_client()
+    get = lambda mobile, ip: client.get(f'/api/recommendations?mobile={mobile}', environ_base={'REMOTE_ADDR': ip}).status_code
+    # Mobile A spends its bucket from three addresses, leaving each with two tokens
+    assert [get('A', f'10.0.0.{i}') for i in (1, 2, 3)] == [200, 200, 200]
+    # Turned away by mobile A's bucket: 10.0.0.1 is not charged for these
+    assert [get('A', '10.0.0.1') for _ in range(4)] == [429] * 4
+    assert [get('B', '10.0.0.1') for _ in range(3)] == [200, 200, 429]
+
+
+@pytest.mark.parametrize('hops, expected', [(1, 200), (0, 429)])
+def test_trusted_proxy_keys_by_forwarded_address(make_app, hops, expected):
+    client = make_app(RATE_LIMITS=LIMITS, RATE_LIMIT_TRUSTED_PROXIES=hops).test_client()
+    get = lambda client_ip: client.get('/api/recommendations', headers={'X-Forwarded-For': client_ip},
+                                       environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code
+    assert [get('203.0.113.7') for _ in range(4)] == [200, 200, 200, 429]
+    # Another client behind the same proxy has its own bucket only when the proxy is trusted
+    assert get('198.51.100.2') == expected
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import serializers
+from app import connect_db
+
+ORDERS = [
+    # id, name, mobile, payment, pre_order, delivery_date, delivery_time, items, status
+    ('o-1', 'Ravi', '+919876500000', 'cash', 0, None, None, '{"Tea": 2, "Idly (3)": 1}', 'PENDING'),
+    ('o-2', 'Sŕī Ñame ☃ "quoted"\n', '+919876500000', 'upi', 1, '2031-01-01', '10:00', '{"Idlé é\U0001f35b": 1}', 'ACCEPTED'),
+    ('o-3', None, '+919876500000', None, None, None, None, 'not json', None),
+    ('o-4', 'Null items', '+919876500000', 'card', 1, '2031-01-02', None, None, 'CANCELLED'),
+    ('o-5', 'List items', '+919876511111', 'cash', 0, '', '', '[1, 2, "x"]', 'PENDING'),
+]
+RATINGS = [
+    ('+919876500000', 'Ravi', 'Tea', 5, 'très bon ☕ "hot"\t'),
+    ('+919876500000', None, 'Idly (3)', 3, None),
+]
+NOTIFICATIONS = [
+    ('+919876500000', 'Votre commande est prête ✅', 'o-1', 30),
+    ('+919876500000', 'No order', None, None),
+]
+
+
+def _legacy_orders(conn):
+    orders = []
+    for r in conn.execute('SELECT * FROM orders ORDER BY created_at DESC').fetchall():
+        try:
+            items = json.loads(r['items'])
+        except Exception:
+            items = {}
+        orders.append({
+            'id': r['id'], 'name': r['name'], 'mobile': r['mobile'], 'payment': r['payment'],
+            'preOrder': bool(r['pre_order']),
+            'delivery': None if not r['delivery_date'] else {'date': r['delivery_date'], 'time': r['delivery_time']},
+            'items': items, 'status': r['status'], 'created_at': r['created_at']
+        })
+    return orders
+
+
+def _legacy_ratings(conn):
+    return [{'id': r['id'], 'user_name': r['user_name'], 'user_mobile': r['user_mobile'], 'item_name': r['item_name'],
+             'rating': r['rating'], 'review': r['review'], 'created_at': r['created_at']}
+            for r in conn.execute('SELECT * FROM ratings ORDER BY created_at DESC').fetchall()]
+
+
+def _legacy_notifications(conn, mobile):
+    rows = conn.execute('SELECT * FROM notifications WHERE user_mobile = ? ORDER BY created_at DESC', (mobile,)).fetchall()
+    return {'ok': True, 'notifications': [
+        {'id': r['id'], 'message': r['message'], 'order_id': r['order_id'], 'eta_minutes': r['eta_minutes'],
+         'created_at': r['created_at'], 'read': bool(r['read'])} for r in rows]}
+
+
+@pytest.mark.parametrize('encoder', sorted(serializers.ENCODERS))
+def test_list_endpoints_match_legacy_output(make_app, encoder):
+    app = make_app(JSON_ENCODER=encoder)
+    conn = connect_db(app.config['DB_PATH'])
+    with conn:
+        conn.executemany('INSERT INTO orders (id, name, mobile, payment, pre_order, delivery_date, delivery_time, items, status) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', ORDERS)
+        conn.executemany('INSERT INTO ratings (user_mobile, user_name, item_name, rating, review) VALUES (?, ?, ?, ?, ?)', RATINGS)
+        conn.executemany('INSERT INTO notifications (user_mobile, message, order_id, eta_minutes) VALUES (?, ?, ?, ?)', NOTIFICATIONS)
+        conn.execute("UPDATE notifications SET read = 1 WHERE order_id IS NULL")
+    client = app.test_client()
+
+    resp = client.get('/api/orders')
+    assert resp.mimetype == 'application/json'
+    assert resp.get_json() == _legacy_orders(conn)
+    mine = client.get('/api/orders?mobile=%2B919876511111').get_json()
+    assert [o['id'] for o in mine] == ['o-5']
+    assert client.get('/api/ratings').get_json() == _legacy_ratings(conn)
+    assert client.get('/api/notifications?mobile=9876500000').get_json() == _legacy_notifications(conn, '+919876500000')
+    conn.close()
+
+
+def test_unknown_encoder_is_rejected():
+    with pytest.raises(ValueError):
+        serializers.get_encoder('yaml')
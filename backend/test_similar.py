@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.mark.parametrize('k', ['-3', '0', '21', 'x', ''])
+def test_k_out_of_range_is_400(make_app, k):
+    resp = make_app().test_client().get(f'/api/recommendations/similar/Tea?k={k}')
+    assert resp.status_code == 400
+
+
+def test_k_limits_neighbours(make_app):
+    resp = make_app().test_client().get('/api/recommendations/similar/Idly (3)?k=3')
+    assert resp.status_code == 200
+    assert len(resp.get_json()['similar']) == 3
+
+
+def test_only_menu_items_are_indexed(make_app):
+    app = make_app()
+    client = app.test_client()
+    index = app.extensions['similar']
+    size = len(index.counts)
+    for i in range(3):
+        review = {'user_mobile': '9876500000', 'item_name': f'not on the menu {i}', 'rating': 3, 'review': 'tasty tea'}
+        assert client.post('/api/ratings', json=review).status_code == 200
+    assert len(index.counts) == size
+    assert client.get('/api/recommendations/similar/not on the menu 0').status_code == 404
@@ -0,0 +1,95 @@
+import time
+import queue
+import sqlite3
+from concurrent.futures import Future
+
+import pytest
+
+import repository
+from writequeue import WriteQueue
+
+ORDER = {'id': 'wq-1', 'name': 'Test', 'mobile': '9876500000', 'payment': 'cash', 'items': {'Tea': 1}}
+
+
+def test_duplicate_order_is_409_through_write_queue(make_app):
+    client = make_app(WRITE_QUEUE_ENABLED=True).test_client()
+    assert client.post('/api/orders', json=ORDER).status_code == 200
+    resp = client.post('/api/orders', json=ORDER)
+    assert resp.status_code == 409
+    assert resp.get_json() == {'error': 'order exists'}
+    assert client.post('/api/orders', json={**ORDER, 'id': 'wq-2'}).status_code == 200
+    assert sorted(o['id'] for o in client.get('/api/orders').get_json()) == ['wq-1', 'wq-2']
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/orders', ORDER),
+    ('/api/ratings', {'user_mobile': '9876500000', 'item_name': 'Tea', 'rating': 4}),
+    ('/api/favorites', {'mobile': '9876500000', 'item': 'Tea'}),
+    ('/api/notifications', {'mobile': '9876500000', 'message': 'hi'}),
+])
+@pytest.mark.parametrize('failure', ['full', 'timeout'])
+def test_saturated_write_queue_answers_503(make_app, monkeypatch, path, body, failure):
+    app = make_app(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_RESULT_TIMEOUT=0.01)
+    wq = app.extensions['writequeue']
+    if failure == 'full':
+        def submit(work):
+            raise queue.Full
+    else:
+        def submit(work):
+            return Future()  # never completes
+    monkeypatch.setattr(wq, 'submit', submit)
+    resp = app.test_client().post(path, json=body)
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '1'
+
+
+def test_failing_unit_does_not_affect_its_batch(tmp_path):
+    path = str(tmp_path / 'wq.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+    conn.close()
+    wq = WriteQueue(path, max_latency=0.05)
+    try:
+        futures = [wq.submit(lambda c, i=i: c.execute('INSERT INTO t (id) VALUES (?)', (i,)).lastrowid)
+                   for i in (1, 2, 2, 3)]
+        assert [f.result(timeout=5) for f in (futures[0], futures[1], futures[3])] == [1, 2, 3]
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[2].result(timeout=5)
+    finally:
+        wq.stop()
+    conn = sqlite3.connect(path)
+    assert [r[0] for r in conn.execute('SELECT id FROM t ORDER BY id')] == [1, 2, 3]
+    conn.close()
+
+
+def _ratings(app):
+    conn = sqlite3.connect(app.config['DB_PATH'])
+    try:
+        return conn.execute('SELECT COUNT(*) FROM ratings').fetchone()[0]
+    finally:
+        conn.close()
+
+
+RATING = {'user_mobile': '9876500000', 'item_name': 'Tea', 'rating': 4}
+
+
+def test_timed_out_write_is_not_committed_after_503(make_app):
+    # The writer holds the unit while it waits for its batch to fill
+    app = make_app(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_MAX_LATENCY=0.5, WRITE_QUEUE_RESULT_TIMEOUT=0.05)
+    resp = app.test_client().post('/api/ratings', json=RATING)
+    assert resp.status_code == 503
+    app.extensions['writequeue'].stop()  # let the stalled batch drain
+    assert _ratings(app) == 0
+
+
+def test_write_already_running_waits_for_its_result(make_app, monkeypatch):
+    insert_rating = repository.insert_rating
+
+    def slow_insert(*args):
+        time.sleep(0.3)
+        return insert_rating(*args)
+
+    monkeypatch.setattr(repository, 'insert_rating', slow_insert)
+    app = make_app(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_MAX_LATENCY=0, WRITE_QUEUE_RESULT_TIMEOUT=0.05)
+    assert app.test_client().post('/api/ratings', json=RATING).status_code == 200
+    assert _ratings(app) == 1
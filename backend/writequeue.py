@@ -0,0 +1,128 @@
+"""Group-commit write queue.
+
+SQLite serializes writers and every commit pays for an fsync. With
+WRITE_QUEUE_ENABLED the request handlers hand their inserts to a single
+writer thread per worker process instead of committing themselves. The
+writer drains the queue and commits up to WRITE_QUEUE_MAX_BATCH units of
+work per transaction, waiting at most WRITE_QUEUE_MAX_LATENCY seconds for a
+batch to fill.
+
+Each unit is a callable taking the writer's connection and runs inside its
+own SAVEPOINT, so one failing unit (e.g. a duplicate order id) is rolled back
+and reported on its own future without affecting the rest of the batch.
+
+The writer does not change the journal mode; startup() sets it for the
+database (SQLITE_JOURNAL_MODE, WAL by default) whether or not the queue is on.
+"""
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+class WriteQueue:
+    def __init__(self, path, max_batch=256, max_latency=0.005, maxsize=10000, put_timeout=1.0):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, work):
+        """Queue `work(conn)` and return a Future for its return value.
+
+        Raises queue.Full if the writer is too far behind.
+        """
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((work, fut), timeout=self.put_timeout)
+        return fut
+
+    def _ensure_started(self):
+        # Threads do not survive fork: start one writer per process, lazily
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked child: drop whatever the parent had queued
+                self._queue = queue.Queue(self._queue.maxsize)
+            self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Flush pending work and stop the writer thread."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put((None, None))
+        self._thread.join(timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch and batch[-1][0] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1][0] is None
+                if stop:
+                    batch.pop()
+                if batch:
+                    self._commit(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        done = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for work, fut in batch:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT unit')
+                try:
+                    result = work(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO unit')
+                    conn.execute('RELEASE unit')
+                    fut.set_exception(e)
+                    continue
+                conn.execute('RELEASE unit')
+                done.append((fut, result))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for fut, _ in done:
+                fut.set_exception(e)
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for fut, result in done:
+            fut.set_result(result)